@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the per-execution overhead of an Executor process: the
+processes compiled at initialisation against the dispatch they replaced, which
+eval'd the source string of the process and each of its msg_args on every
+execution. A log process is used, its work being negligible next to the dispatch.
+
+usage: bench_executor_dispatch.py [executions]
+"""
+##########################################################################################
+from sentor.Executor import Executor, Process
+import timeit
+import sys
+
+
+CONFIG = {"log": {"message": "battery at {}% ({} V), charging: {}", "level": "info",
+                  "msg_args": ["msg.battery.percentage", "msg.battery.voltage", "msg.battery.charging"]}}
+
+
+class Battery(object):
+    __slots__ = ["percentage", "voltage", "charging"]
+
+    def __init__(self):
+        self.percentage = 42.
+        self.voltage = 24.5
+        self.charging = False
+
+
+class Status(object):
+    __slots__ = ["battery"]
+
+    def __init__(self):
+        self.battery = Battery()
+
+
+class LegacyDispatch(object):
+    """
+    the dispatch of Executor before the processes were compiled
+    """
+    def __init__(self, process, event_cb):
+        self.event_cb = event_cb
+        self.msg = None
+        self.process = {"name": "log", "verbose": False, "func": "self.log(**kwargs)",
+                        "kwargs": {"message": process["log"]["message"], "level": process["log"]["level"],
+                                   "msg_args": process["log"]["msg_args"]}}
+
+    def execute(self, msg):
+        self.msg = msg
+        process = self.process
+        if process["verbose"] and "def_msg" in process:
+            self.event_cb(process["def_msg"][0], process["def_msg"][1], process["def_msg"][2])
+        kwargs = process["kwargs"]
+        eval(process["func"])
+
+    def log(self, message, level, msg_args):
+        msg = self.msg
+        if msg is not None and msg_args is not None:
+            args = [eval(arg) for arg in msg_args]
+            self.event_cb("CUSTOM MSG: " + message.format(*args), level)
+        else:
+            self.event_cb("CUSTOM MSG: " + message, level)
+
+
+def event_cb(string, type, msg=""):
+    pass
+
+
+def bench(executions):
+    executor = Executor([CONFIG], event_cb)
+    # initialised in the background, or here if not done yet
+    executor.init_process(0)
+    process = executor.processes[0]
+    assert isinstance(process, Process), process
+
+    legacy = LegacyDispatch(CONFIG, event_cb)
+    msg = Status()
+
+    def compiled():
+        if process.verbose and process.def_msg is not None:
+            event_cb(*process.def_msg)
+        process.run(msg)
+
+    def evaluated():
+        legacy.execute(msg)
+
+    compiled_time = min(timeit.repeat(compiled, number=executions, repeat=5)) / executions
+    evaluated_time = min(timeit.repeat(evaluated, number=executions, repeat=5)) / executions
+    print("log process with %d msg_args: compiled %6.2f us, eval'd %6.2f us per execution, speedup %.1fx" % (
+        len(CONFIG["log"]["msg_args"]), compiled_time * 1e6, evaluated_time * 1e6, evaluated_time / compiled_time))
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
+##########################################################################################
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Benchmark of the lambda expressions of a topic evaluated separately, as each
+ROSTopicFilter does, against the evaluator fused by ExpressionCompiler.
+
+usage: bench_expression_compiler.py [number of expressions] [messages]
+"""
+##########################################################################################
+from __future__ import division
+from sentor.ExpressionCompiler import ExpressionCompiler
+import timeit
+import sys
+
+
+class Battery(object):
+    __slots__ = ["percentage", "voltage", "charging"]
+
+    def __init__(self):
+        self.percentage = 42.
+        self.voltage = 24.5
+        self.charging = False
+
+
+class Status(object):
+    __slots__ = ["battery", "data", "mode"]
+
+    def __init__(self):
+        self.battery = Battery()
+        self.data = True
+        self.mode = "autonomous"
+
+
+# lambdas reading the same field paths, as in config/example.yaml
+TEMPLATES = ["lambda msg : msg.data == True",
+             "lambda msg : msg.data == False",
+             "lambda msg : msg.battery.percentage < {}",
+             "lambda msg : msg.battery.percentage < {} and not msg.battery.charging",
+             "lambda msg : msg.battery.voltage * msg.battery.percentage / 100. < {}",
+             "lambda msg : msg.mode != 'autonomous' and msg.battery.percentage < {}"]
+
+
+def make_expressions(n):
+    return [TEMPLATES[i % len(TEMPLATES)].format(10 + i) for i in range(n)]
+
+
+def bench(n, messages):
+    lambda_fn_strs = make_expressions(n)
+    lambda_fns = [eval(lambda_fn_str) for lambda_fn_str in lambda_fn_strs]
+    compiler = ExpressionCompiler(lambda_fn_strs)
+    msg = Status()
+
+    # same results either way
+    assert [fn(msg) for fn in lambda_fns] == compiler.evaluate(msg)
+
+    def separate():
+        for fn in lambda_fns:
+            fn(msg)
+
+    def fused():
+        compiler.evaluate(msg)
+
+    separate_time = min(timeit.repeat(separate, number=messages, repeat=5)) / messages
+    fused_time = min(timeit.repeat(fused, number=messages, repeat=5)) / messages
+    print("%3d expressions (%d fused): separate %7.2f us/msg, fused %7.2f us/msg, speedup %.2fx" % (
+        n, len(compiler.fused_indices), separate_time * 1e6, fused_time * 1e6, separate_time / fused_time))
+
+
+if __name__ == "__main__":
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    counts = [int(sys.argv[1])] if len(sys.argv) > 1 else [1, 2, 6, 12, 24]
+    for n in counts:
+        bench(n, messages)
+##########################################################################################
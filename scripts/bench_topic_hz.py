@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the ROSTopicHz window at a 10 kHz message rate: the ring
+buffer with running sums and monotonic deques against the list window it
+replaced, which popped its first item and scanned the whole window on every poll.
+
+usage: bench_topic_hz.py [window size] [messages]
+"""
+##########################################################################################
+from __future__ import division
+from sentor.ROSTopicHz import ROSTopicHz
+import threading
+import random
+import timeit
+import math
+import sys
+
+
+RATE = 10000.
+
+
+class ListHz(object):
+    """
+    the window of ROSTopicHz before the ring buffer
+    """
+    def __init__(self, window_size):
+        self.window_size = window_size
+        self.times = []
+        self.lock = threading.Lock()
+
+    def push(self, delta):
+        self.times.append(delta)
+        if len(self.times) > self.window_size - 1:
+            self.times.pop(0)
+
+    def get_stats(self):
+        n = len(self.times)
+        mean = sum(self.times) / n
+        rate = 1./mean if mean > 0. else 0
+        std_dev = math.sqrt(sum((x - mean)**2 for x in self.times) / n)
+        return rate, min(self.times), max(self.times), std_dev, n
+
+
+def bench(window_size, messages):
+    random.seed(0)
+    deltas = [random.gauss(1. / RATE, 0.1 / RATE) for _ in range(messages)]
+
+    ring = ROSTopicHz("/bench", window_size)
+    ring_stamps = [0.]
+    def ring_push():
+        for delta in deltas:
+            ring_stamps[0] += delta
+            with ring.lock:
+                ring.push(delta, ring_stamps[0])
+
+    listed = ListHz(window_size)
+    def list_push():
+        for delta in deltas:
+            with listed.lock:
+                listed.push(delta)
+
+    # the windows are full before the timing
+    ring_push()
+    list_push()
+    expected = listed.get_stats()
+    with ring.lock:
+        stats = ring.get_stats()
+    assert all(abs(a - b) <= 1e-6 * max(abs(b), 1.) for a, b in zip(stats, expected)), (stats, expected)
+
+    def ring_stats():
+        with ring.lock:
+            ring.get_stats()
+
+    ring_push_time = min(timeit.repeat(ring_push, number=1, repeat=3)) / messages
+    list_push_time = min(timeit.repeat(list_push, number=1, repeat=3)) / messages
+    ring_stats_time = min(timeit.repeat(ring_stats, number=1000, repeat=3)) / 1000
+    list_stats_time = min(timeit.repeat(listed.get_stats, number=10, repeat=3)) / 10
+
+    print("window %6d: update ring %6.2f us, list %6.2f us | query ring %8.2f us, list %8.2f us" % (
+        window_size, ring_push_time * 1e6, list_push_time * 1e6, ring_stats_time * 1e6, list_stats_time * 1e6))
+    # the messages of one second, with the stats polled on every message as ROSTopicRate does
+    print("              1 s at %d Hz polled per message: ring %.3f s, list %.3f s" % (
+        RATE, RATE * (ring_push_time + ring_stats_time), RATE * (list_push_time + list_stats_time)))
+
+
+if __name__ == "__main__":
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    sizes = [int(sys.argv[1])] if len(sys.argv) > 1 else [1000, 10000]
+    for window_size in sizes:
+        bench(window_size, messages)
+##########################################################################################
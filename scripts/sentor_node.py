@@ -8,6 +8,13 @@ from __future__ import division
 from sentor.TopicMonitor import TopicMonitor
 from sentor.SafetyMonitor import SafetyMonitor
 from sentor.MultiMonitor import MultiMonitor
+from sentor.BandwidthMonitor import BandwidthMonitor
+from sentor.ThrottledPublisher import ThrottledPublisher
+from sentor.WorkerPool import get_worker_pool
+from sentor.ProcessRegistry import get_process_registry
+from sentor.ExecutorMetrics import get_executor_metrics
+from sentor.ShellRunner import get_shell_runner
+from sentor.TopicSubscriber import advertise_subscriber_stats
 from std_msgs.msg import String
 from sentor.msg import SentorEvent
 from std_srvs.srv import Empty, EmptyResponse
@@ -36,11 +43,8 @@ def __signal_handler(signum, frame):
             topic_monitor.kill_monitor()
         safety_monitor.stop_monitor()
         multi_monitor.stop_monitor()
-    def join_monitors():
-        for topic_monitor in topic_monitors:
-            topic_monitor.join()
+        bandwidth_monitor.stop_monitor()
     kill_monitors()
-    join_monitors()
     print "stopped."
     os._exit(signal.SIGTERM)
     
@@ -51,6 +55,7 @@ def stop_monitoring(_):
         
     safety_monitor.stop_monitor()
     multi_monitor.stop_monitor()
+    bandwidth_monitor.stop_monitor()
 
     rospy.logwarn("sentor_node stopped monitoring")
     ans = EmptyResponse()
@@ -63,12 +68,18 @@ def start_monitoring(_):
 
     safety_monitor.start_monitor()
     multi_monitor.start_monitor()
+    bandwidth_monitor.start_monitor()
 
     rospy.logwarn("sentor_node started monitoring")
     ans = EmptyResponse()
     return ans
     
 
+def report_processes(_):
+    for kind, (requested, created) in sorted(get_process_registry().get_counts().items()):
+        rospy.loginfo("%d '%s' processes share %d handles" % (requested, kind, created))
+    
+
 def event_callback(string, type, msg="", nodes=[], topic=""):
     if type == "info":
         rospy.loginfo(string + '\n' + str(msg))
@@ -107,15 +118,45 @@ if __name__ == "__main__":
     stop_srv = rospy.Service('/sentor/stop_monitor', Empty, stop_monitoring)
     start_srv = rospy.Service('/sentor/start_monitor', Empty, start_monitoring)
 
-    event_pub = rospy.Publisher('/sentor/event', String, queue_size=10)
-    rich_event_pub = rospy.Publisher('/sentor/rich_event', SentorEvent, queue_size=10)
+    # the events are published without delay unless a sink needs them spaced out,
+    # e.g. an event_min_interval of 0.1 for slackeros
+    event_min_interval = rospy.get_param("~event_min_interval", 0.0)
+    rich_event_min_interval = rospy.get_param("~rich_event_min_interval", 0.0)
+    event_pub = ThrottledPublisher('/sentor/event', String, event_min_interval, queue_size=10)
+    rich_event_pub = ThrottledPublisher('/sentor/rich_event', SentorEvent, rich_event_min_interval, queue_size=10)
 
     safe_operation_timeout = rospy.get_param("~safe_operation_timeout", 10.0)    
     safety_pub_rate = rospy.get_param("~safety_pub_rate", 10.0)    
     auto_safety_tagging = rospy.get_param("~auto_safety_tagging", True)        
     safety_monitor = SafetyMonitor(safe_operation_timeout, safety_pub_rate, auto_safety_tagging, event_callback) 
     
-    multi_monitor = MultiMonitor()
+    # publish only the changed safety critical conditions on /sentor/monitors_delta as well
+    monitors_delta = rospy.get_param("~monitors_delta", False)
+    # with deltas, the full conditions on /sentor/monitors are published at most at this rate
+    monitors_full_rate = rospy.get_param("~monitors_full_rate", 1.0)
+    multi_monitor = MultiMonitor(monitors_delta, monitors_full_rate)
+
+    # threads shared by all the monitors to execute their processes
+    executor_workers = rospy.get_param("~executor_workers", 4)
+    # extra threads running only safety critical processes, so that these are not held
+    # up by processes blocking the other threads (waiting actions, shells or sleeps)
+    executor_reserved_workers = rospy.get_param("~executor_reserved_workers", 1)
+    get_worker_pool(executor_workers, executor_reserved_workers)
+
+    # shell processes running at once, the others wait for one to exit
+    shell_max_concurrent = rospy.get_param("~shell_max_concurrent", 4)
+    get_shell_runner(shell_max_concurrent)
+
+    # timings and failures of the processes executed
+    executor_stats_pub_rate = rospy.get_param("~executor_stats_pub_rate", 0.2)
+    get_executor_metrics().watch_pool(get_worker_pool())
+    get_executor_metrics().advertise(executor_stats_pub_rate)
+
+    # messages throttled and dropped by the shared subscriptions
+    advertise_subscriber_stats()
+
+    bandwidth_pub_rate = rospy.get_param("~bandwidth_pub_rate", 1.0)
+    bandwidth_monitor = BandwidthMonitor(bandwidth_pub_rate)
 
     topic_monitors = []
     print "Monitoring topics:"
@@ -133,6 +174,10 @@ if __name__ == "__main__":
         timeout = 0
         default_notifications = True
         include = True
+        partial_deserialization = False
+        execute_queue_size = 10
+        execute_overflow = "coalesce"
+        execute_min_interval = 0.0
         
         if 'rate' in topic:
             rate = topic['rate']
@@ -148,14 +193,26 @@ if __name__ == "__main__":
             default_notifications = topic['default_notifications']
         if 'include' in topic:
             include = topic['include']
+        if 'partial_deserialization' in topic:
+            partial_deserialization = topic['partial_deserialization']
+        if 'execute_queue_size' in topic:
+            execute_queue_size = topic['execute_queue_size']
+        if 'execute_overflow' in topic:
+            execute_overflow = topic['execute_overflow']
+        if 'execute_min_interval' in topic:
+            execute_min_interval = topic['execute_min_interval']
 
         if include:
             topic_monitor = TopicMonitor(topic_name, rate, signal_when, signal_lambdas, processes, 
-                                         timeout, default_notifications, event_callback, i)
+                                         timeout, default_notifications, event_callback, i, partial_deserialization,
+                                         execute_queue_size, execute_overflow, execute_min_interval)
 
             topic_monitors.append(topic_monitor)
             safety_monitor.register_monitors(topic_monitor)
             multi_monitor.register_monitors(topic_monitor)
+            bandwidth_monitor.register_monitors(topic_monitor)
+            
+    multi_monitor.publish_monitors()
             
     time.sleep(1)
 
@@ -163,5 +220,10 @@ if __name__ == "__main__":
     for topic_monitor in topic_monitors:
         topic_monitor.start()
 
+    # report how many process handles are shared once the processes are initialised
+    process_report_delay = rospy.get_param("~process_report_delay", 10.0)
+    if process_report_delay > 0:
+        rospy.Timer(rospy.Duration(process_report_delay), report_processes, oneshot=True)
+
     rospy.spin()
 ##########################################################################################
\ No newline at end of file
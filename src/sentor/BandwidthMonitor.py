@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+#####################################################################################
+from __future__ import division
+import rospy
+from sentor.msg import TopicBandwidthArray
+from threading import Event
+
+
+class BandwidthMonitor(object):
+    """
+    BandwidthMonitor periodically publishes the bandwidth and message size stats of
+    all the monitored topics in one message, one row per topic whatever the number
+    of monitors of the topic
+    """
+
+    def __init__(self, rate=1.0):
+
+        self.topic_monitors = []
+        self._stop_event = Event()
+
+        self.bandwidth_pub = rospy.Publisher("/sentor/bandwidth", TopicBandwidthArray, queue_size=1)
+
+        if rate > 0:
+            rospy.Timer(rospy.Duration(1.0/rate), self.cb)
+
+
+    def register_monitors(self, topic_monitor):
+        self.topic_monitors.append(topic_monitor)
+
+
+    def cb(self, event=None):
+
+        if self._stop_event.isSet():
+            return
+
+        stats = TopicBandwidthArray()
+        stats.header.stamp = rospy.Time.now()
+
+        topics = set()
+        for monitor in self.topic_monitors:
+            if monitor.bw_monitor is None or monitor.topic_name in topics:
+                continue
+            topics.add(monitor.topic_name)
+
+            bw = monitor.bw_monitor.get_stats()
+            if bw is None:
+                bw = (0., 0., 0, 0.)
+            bytes_per_sec, mean_size, max_size, rate = bw
+
+            stats.topics.append(monitor.topic_name)
+            stats.bytes_per_sec.append(bytes_per_sec)
+            stats.mean_size.append(mean_size)
+            stats.max_size.append(max_size)
+            stats.rate.append(rate)
+
+        self.bandwidth_pub.publish(stats)
+
+
+    def stop_monitor(self):
+        self._stop_event.set()
+
+
+    def start_monitor(self):
+        self._stop_event.clear()
+#####################################################################################
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+#####################################################################################
+from threading import Thread, Condition, Lock
+import heapq
+import itertools
+import rospy
+
+
+# seconds between two readings of the clock under simulated time, which may run at any rate
+SIM_TIME_POLL = 0.01
+
+
+class Deadline(object):
+    """
+    A deadline that calls back when it has not been reset for `timeout` seconds.
+    Resetting an armed deadline only moves its expiry, the heap is fixed up lazily
+    by the scheduler when the old entry comes due.
+    """
+    def __init__(self, scheduler, timeout, callback, period=None):
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self.callback = callback
+        self.period = period
+
+        self.expiry = None
+        self.queued = False
+
+    def reset(self, timeout=None):
+        """
+        (re)arm the deadline to expire `timeout` seconds from now
+        """
+        if timeout is not None:
+            self.timeout = timeout
+        self.scheduler.arm(self, rospy.get_time() + self.timeout)
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def is_armed(self):
+        return self.expiry is not None
+
+
+class DeadlineScheduler(Thread):
+    """
+    DeadlineScheduler runs the callbacks of all the deadlines from a single thread,
+    using a heap ordered by expiry. Time is ROS time, like the rospy.Timers the
+    deadlines replace and the windows of the monitors.
+    """
+    def __init__(self):
+        Thread.__init__(self)
+        self.daemon = True
+
+        self._cond = Condition()
+        self._heap = []
+        self._counter = itertools.count()
+        self._last_now = None
+
+    def deadline(self, timeout, callback, period=None):
+        """
+        return a new unarmed Deadline
+        @param timeout: seconds from a reset to the expiry
+        @param callback: called with the Deadline when it expires
+        @param period: if set the deadline re-arms itself every period seconds after expiring
+        """
+        return Deadline(self, timeout, callback, period)
+
+    def arm(self, deadline, expiry):
+        with self._cond:
+            deadline.expiry = expiry
+            if not deadline.queued:
+                deadline.queued = True
+                self._push(deadline, expiry)
+
+    def cancel(self, deadline):
+        with self._cond:
+            deadline.expiry = None
+
+    def _push(self, deadline, expiry):
+        heapq.heappush(self._heap, (expiry, next(self._counter), deadline))
+        if self._heap[0][2] is deadline:
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                deadline = self._next()
+                if deadline is None:
+                    continue
+
+            try:
+                deadline.callback(deadline)
+            except Exception as e:
+                rospy.logerr("Exception in deadline callback: %s" % e)
+
+    def _next(self):
+        """
+        wait for the next deadline due, must be called with the lock held
+        """
+        if not self._heap:
+            self._cond.wait()
+            return None
+
+        when, _, deadline = self._heap[0]
+        now = rospy.get_time()
+        if self._last_now is not None and now < self._last_now:
+            self._shift(now - self._last_now)
+        self._last_now = now
+
+        if when > now:
+            wait = when - now
+            if not rospy.rostime.is_wallclock():
+                wait = min(wait, SIM_TIME_POLL)
+            self._cond.wait(wait)
+            return None
+
+        heapq.heappop(self._heap)
+        if deadline.expiry is None:
+            deadline.queued = False
+            return None
+
+        if deadline.expiry > when:
+            # the deadline was reset since this entry was pushed
+            heapq.heappush(self._heap, (deadline.expiry, next(self._counter), deadline))
+            return None
+
+        if deadline.period:
+            deadline.expiry = now + deadline.period
+            heapq.heappush(self._heap, (deadline.expiry, next(self._counter), deadline))
+        else:
+            deadline.expiry = None
+            deadline.queued = False
+
+        return deadline
+
+    def _shift(self, delta):
+        """
+        ROS time moved backwards, e.g. a bag looping, move the deadlines back by as
+        much so that they keep the time left to them, must be called with the lock held
+        """
+        self._heap = [(when + delta, count, deadline) for when, count, deadline in self._heap]
+        heapq.heapify(self._heap)
+        for _, _, deadline in self._heap:
+            if deadline.expiry is not None:
+                deadline.expiry += delta
+
+
+_scheduler = None
+_scheduler_lock = Lock()
+
+def get_scheduler():
+    """
+    return the deadline scheduler shared by all the monitors, starting it on first use
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = DeadlineScheduler()
+            _scheduler.start()
+        return _scheduler
+#####################################################################################
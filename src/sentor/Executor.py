@@ -5,331 +5,477 @@ Created on Thu Nov 21 10:30:22 2019
 @author: Adam Binch (abinch@sagarobotics.com)
 """
 #####################################################################################
-import rospy, rosservice, rostopic, actionlib, subprocess
-import dynamic_reconfigure.client
-import os, numpy, math
-from threading import Lock
+import rospy, rosservice, actionlib
+import os, numpy, math, collections, functools, json
+from sentor.MasterSnapshot import get_master_snapshot
+from sentor.ServiceProxyPool import get_service_proxy_pool
+from sentor.ReconfigureClients import get_reconfigure_clients
+from sentor.ProcessRegistry import get_process_registry
+from sentor.ExecutorMetrics import get_executor_metrics
+from sentor.ShellRunner import get_shell_runner, KILL_POLICIES
+from sentor.WorkerPool import WorkerPool
+from sentor.TimerWheel import get_timer_wheel
+from threading import Lock, Event
+import time
+
+
+# delays between the attempts to initialise a process whose server is not up
+INIT_RETRY_MIN = 1.0
+INIT_RETRY_MAX = 30.0
+
+
+class Process(object):
+    """
+    A process compiled at initialisation: a bound method of the executor with its
+    keyword arguments, run without any parsing when the process is executed
+    """
+    __slots__ = ["name", "func", "kwargs", "verbose", "def_msg", "pass_msg", "target", "limiter", "timed"]
+
+    def __init__(self, name, func, kwargs, verbose=False, def_msg=None, pass_msg=False, target=None, timed=True):
+        self.name = name
+        self.func = func
+        self.kwargs = kwargs
+        self.verbose = verbose
+        self.def_msg = def_msg
+        # whether func takes the message that triggered the execution
+        self.pass_msg = pass_msg
+        # what the process acts on, identical processes on the same target share their rate limit
+        self.target = target
+        self.limiter = None
+        # False if the process completes in the background and records its own metrics
+        self.timed = timed
+
+    def run(self, msg):
+        """
+        @return: False if the process failed without raising
+        """
+        if self.pass_msg:
+            return self.func(msg, **self.kwargs)
+        else:
+            return self.func(**self.kwargs)
+
+
+class RateLimiter(object):
+    """
+    Allows an execution at most once per min_interval seconds
+    """
+    __slots__ = ["min_interval", "last", "_lock"]
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.last = None
+        self._lock = Lock()
+
+    def allow(self):
+        with self._lock:
+            now = time.time()
+            if self.last is not None and now - self.last < self.min_interval:
+                return False
+            self.last = now
+            return True
+
+
+def compile_args(args, name):
+    """
+    compile the python statements or expressions of a process config, so that errors
+    are reported at initialisation
+    """
+    mode = "eval" if name == "msg_args" else "exec"
+    return [compile(arg, "<{}>".format(name), mode) for arg in args]
+
+
+_init_pool = None
+_init_pool_lock = Lock()
+
+def get_init_pool():
+    """
+    return the worker pool initialising the processes of all the executors, apart
+    from the one executing them so that waiting for servers does not delay executions
+    """
+    global _init_pool
+    with _init_pool_lock:
+        if _init_pool is None:
+            _init_pool = WorkerPool(num_workers=16)
+        return _init_pool
+
+
+class ProcessTimeout(Exception):
+    """
+    Raised when a process does not complete in time
+    """
+    pass
+
+
+def is_timeout(e):
+    return isinstance(e, ProcessTimeout) or (isinstance(e, rospy.ROSException) and "timeout" in str(e).lower())
+
+
+class ProcessNotAvailable(Exception):
+    """
+    Raised when a process cannot be initialised yet because its server, service or
+    topic is not up, in which case its initialisation is retried
+    """
+    pass
 
 
 class Executor(object):
     
     
-    def __init__(self, config, event_cb):
+    def __init__(self, config, event_cb, name="", min_interval=0.0):
 
         self.config = config
         self.event_cb = event_cb
+        self.name = name
+
+        # a sequence of processes is not executed again within min_interval seconds
+        self.min_interval = min_interval
+        self.sequence_limiters = {}
         
         self.init_err_str = "Unable to initialise process of type '{}': {}"
         self._lock = Lock()
-        self.processes = []
-        
-        for process in config:
-            
-            process_type = process.keys()[0]
-            
-            if process_type == "call":
-                self.init_call(process)
-                
-            elif process_type == "publish":
-                self.init_publish(process)
-                
-            elif process_type == "action":
-                self.init_action(process)
-                
-            elif process_type == "sleep":
-                self.init_sleep(process)
-                
-            elif process_type == "shell":
-                self.init_shell(process)
-                
-            elif process_type == "log":
-                self.init_log(process)
-                
-            elif process_type == "reconf":
-                self.init_reconf(process)
 
-            elif process_type == "lock_acquire":
-                self.init_lock_acquire(process)
+        # the action clients only keep weak references to the goals they track
+        self.goal_handles = set()
+        self._goals_lock = Lock()
 
-            elif process_type == "lock_release":
-                self.init_lock_release(process)
-                
-            elif process_type == "custom":
-                self.init_custom(process)
-                
-            else:
-                self.event_cb("Process of type '{}' not supported".format(process_type), "warn")
-                self.processes.append("not_initialised")
+        self.init_funcs = {"call": self.init_call, "publish": self.init_publish, "action": self.init_action,
+                           "sleep": self.init_sleep, "shell": self.init_shell, "log": self.init_log,
+                           "reconf": self.init_reconf, "lock_acquire": self.init_lock_acquire,
+                           "lock_release": self.init_lock_release, "custom": self.init_custom}
+
+        # None until the process is initialised, "not_initialised" if it cannot be
+        self.processes = [None] * len(config)
+        self.init_locks = [Lock() for _ in config]
+        self.init_attempts = [0] * len(config)
+        self.init_times = [None] * len(config)
+        self.init_retry_delays = [INIT_RETRY_MIN] * len(config)
+        self.init_retry_pending = [False] * len(config)
+        self.init_started = time.time()
+
+        # the processes of all the executors are initialised concurrently, in the background
+        for index in range(len(config)):
+            get_init_pool().add_queue(self.init_queue(index), max_size=1, overflow="coalesce")
+            self.submit_init(index)
         
         self.default_indices = range(len(self.processes))        
-        print "\n"
                     
                     
+    def init_queue(self, index):
+        return "{} init {}".format(id(self), index)
+
+
+    def submit_init(self, index):
+        # at most one attempt is pending per process
+        get_init_pool().submit(self.init_queue(index), self.init_process, (index,), key="init")
+
+
+    def retry_init(self, index):
+        self.init_retry_pending[index] = False
+        self.submit_init(index)
+
+
+    def init_process(self, index):
+        """
+        initialise a process, scheduling a retry in the background if its server is
+        not up yet
+        @return: whether the process is initialised
+        """
+        with self.init_locks[index]:
+            if self.processes[index] is not None:
+                return self.processes[index] != "not_initialised"
+
+            process = self.config[index]
+            process_type = process.keys()[0]
+            init = self.init_funcs.get(process_type)
+            if init is None:
+                self.event_cb("Process of type '{}' not supported".format(process_type), "warn")
+                self.processes[index] = "not_initialised"
+                return False
+
+            self.init_attempts[index] += 1
+            start = time.time()
+            try:
+                self.processes[index] = init(process)
+
+            except ProcessNotAvailable as e:
+                if self.init_attempts[index] == 1:
+                    self.event_cb(self.init_err_str.format(process_type, str(e)) + ", retrying in the background", "warn")
+                if not self.init_retry_pending[index]:
+                    delay = self.init_retry_delays[index]
+                    self.init_retry_delays[index] = min(delay * 2, INIT_RETRY_MAX)
+                    self.init_retry_pending[index] = True
+                    get_timer_wheel().call_later(delay, lambda _: self.retry_init(index))
+                return False
+
+            except Exception as e:
+                self.event_cb(self.init_err_str.format(process_type, str(e)), "warn")
+                self.processes[index] = "not_initialised"
+                return False
+
+            self.init_times[index] = time.time() - start
+            self.processes[index].limiter = self.get_rate_limiter(process_type, process, self.processes[index].target)
+            rospy.loginfo("%sprocess %d of type '%s' initialised in %.2f seconds (%.2f seconds after startup, %d attempts)" % 
+                          (self.name + ": " if self.name else "", index, process_type, self.init_times[index], 
+                           time.time() - self.init_started, self.init_attempts[index]))
+            return True
+
+
+    def get_rate_limiter(self, process_type, process, target):
+        # identical processes (same target and arguments) share their limit, whichever
+        # monitor runs them, so that e.g. different calls to a service do not suppress each other
+        config = process[process_type]
+        if not isinstance(config, dict) or config.get("min_interval", 0) <= 0:
+            return None
+        min_interval = config["min_interval"]
+        if target is None:
+            return RateLimiter(min_interval)
+        key = (process_type, target, json.dumps(config, sort_keys=True, default=str))
+        return get_process_registry().get("rate limit", key, lambda: RateLimiter(min_interval))
+
+
+    def get_config_target(self, process_type, config):
+        """
+        return the target of a process from its config, as far as it is known before
+        its initialisation
+        """
+        if not isinstance(config, dict):
+            return None
+        for key in ("service_name", "topic_name", "namespace"):
+            if key in config:
+                return config[key]
+        if process_type == "shell" and "cmd_args" in config:
+            return tuple(config["cmd_args"])
+        return None
+
+
+    def get_init_report(self):
+        """
+        return [(process type, state, initialisation time in seconds, attempts)] for
+        each process, where state is 'initialised', 'pending' or 'not_initialised'
+        """
+        report = []
+        for index, process in enumerate(self.processes):
+            state = "pending" if process is None else "not_initialised" if process == "not_initialised" else "initialised"
+            report.append((self.config[index].keys()[0], state, self.init_times[index], self.init_attempts[index]))
+        return report
+
+
     def init_call(self, process):
         
+        service_name = process["call"]["service_name"]
+        service_name = self.get_name(service_name)
+                
         try:
-            service_name = process["call"]["service_name"]
-            service_name = self.get_name(service_name)
-                    
             service_class = rosservice.get_service_class_by_name(service_name)
-            
-            timeout_srv = 1.0
-            if "timeout" in process["call"]:
-                timeout_srv = process["call"]["timeout"]
-            
-            req = service_class._request_class()
-            for arg in process["call"]["service_args"]: exec(arg)
-
-            d = {}
-            d["name"] = "call"
-            d["verbose"] = self.is_verbose(process["call"])
-            d["def_msg"] = ("Calling service '{}'".format(service_name), "info", req)
-            d["func"] = "self.call(**kwargs)"
-            d["kwargs"] = {}
-            d["kwargs"]["service_name"] = service_name
-            d["kwargs"]["service_class"] = service_class
-            d["kwargs"]["req"] = req
-            d["kwargs"]["verbose"] = self.is_verbose(process["call"])
-            d["kwargs"]["timeout_srv"] = timeout_srv
-            
-            self.processes.append(d)
-            
-        except Exception as e:
-            self.event_cb(self.init_err_str.format("call", str(e)), "warn")
-            self.processes.append("not_initialised")
-            
-            
+        except rosservice.ROSServiceException as e:
+            raise ProcessNotAvailable(str(e))
+        
+        timeout_srv = 1.0
+        if "timeout" in process["call"]:
+            timeout_srv = process["call"]["timeout"]
+
+        max_concurrent = 0
+        if "max_concurrent" in process["call"]:
+            max_concurrent = process["call"]["max_concurrent"]
+        
+        req = service_class._request_class()
+        for code in compile_args(process["call"]["service_args"], "service_args"): 
+            exec(code, globals(), {"req": req})
+
+        kwargs = {}
+        kwargs["service_name"] = service_name
+        service_proxy = get_service_proxy_pool().get(service_name, service_class, max_concurrent)
+        kwargs["service_proxy"] = get_process_registry().get("call", (service_name, service_class._type), 
+                                                             lambda: service_proxy)
+        kwargs["req"] = req
+        kwargs["verbose"] = self.is_verbose(process["call"])
+        kwargs["timeout_srv"] = timeout_srv
+        
+        return Process("call", self.call, kwargs, self.is_verbose(process["call"]),
+                       ("Calling service '{}'".format(service_name), "info", req), target=service_name)
+
+
     def init_publish(self, process):
         
-        try:
-            topic_name = process["publish"]["topic_name"]
-            topic_name = self.get_name(topic_name)
-            
-            topic_latched = False
-            if "topic_latched" in process["publish"]:
-                topic_latched = process["publish"]["topic_latched"]
-            
-            msg_class, real_topic, _ = rostopic.get_topic_class(topic_name)
-            pub = rospy.Publisher(real_topic, msg_class, latch=topic_latched, 
-                                  queue_size=10)
-            
-            msg = msg_class()
-            for arg in process["publish"]["topic_args"]: exec(arg)
-                
-            d = {}
-            d["name"] = "publish"
-            d["verbose"] = self.is_verbose(process["publish"])
-            d["def_msg"] = ("Publishing to topic '{}'".format(topic_name), "info", msg)
-            d["func"] = "self.publish(**kwargs)"
-            d["kwargs"] = {}
-            d["kwargs"]["pub"] = pub
-            d["kwargs"]["msg"] = msg
-            
-            self.processes.append(d)
-            
-        except Exception as e:
-            self.event_cb(self.init_err_str.format("publish", str(e)), "warn")
-            self.processes.append("not_initialised")
-            
+        topic_name = process["publish"]["topic_name"]
+        topic_name = self.get_name(topic_name)
+        
+        topic_latched = False
+        if "topic_latched" in process["publish"]:
+            topic_latched = process["publish"]["topic_latched"]
+        
+        msg_class, real_topic = get_master_snapshot().get_topic_class(topic_name)
+        if real_topic is None:
+            raise ProcessNotAvailable("Topic '{}' is not published".format(topic_name))
+        # the publisher is shared by the processes publishing to the same topic
+        pub = get_process_registry().get("publish", (real_topic, msg_class._type, topic_latched),
+                                         lambda: rospy.Publisher(real_topic, msg_class, latch=topic_latched, 
+                                                                 queue_size=10))
+        
+        msg = msg_class()
+        for code in compile_args(process["publish"]["topic_args"], "topic_args"): 
+            exec(code, globals(), {"msg": msg})
             
+        kwargs = {}
+        kwargs["pub"] = pub
+        kwargs["msg"] = msg
+        
+        return Process("publish", self.publish, kwargs, self.is_verbose(process["publish"]),
+                       ("Publishing to topic '{}'".format(topic_name), "info", msg), target=real_topic)
+
+
     def init_action(self, process):
         
-        try:
-            namespace = process["action"]["namespace"]
-            package = process["action"]["package"]
-            spec = process["action"]["action_spec"]
-            
-            exec("from {}.msg import {} as action_spec".format(package, spec))
-            exec("from {}.msg import {} as goal_class".format(package, spec[:-6] + "Goal"))
-            
-            rospy.sleep(1.0)
-            
-            action_client = actionlib.SimpleActionClient(namespace, action_spec)
-            wait = action_client.wait_for_server(rospy.Duration(5.0))
-            if not wait:
-                e = "Action server with namespace '{}' and action spec '{}' not available".format(namespace, spec)
-                self.event_cb(self.init_err_str.format("action", e), "warn")
-                self.processes.append("not_initialised")
-                return
-    
-            goal = goal_class()
-            for arg in process["action"]["goal_args"]: exec(arg)
-                
-            d = {}
-            d["name"] = "action"
-            d["verbose"] = self.is_verbose(process["action"])
-            d["def_msg"] = ("Sending goal for action with spec '{}'".format(spec), "info", goal)
-            d["func"] = "self.action(**kwargs)"
-            d["kwargs"] = {}
-            d["kwargs"]["spec"] = spec
-            d["kwargs"]["action_client"] = action_client
-            d["kwargs"]["goal"] = goal
-            d["kwargs"]["verbose"] = self.is_verbose(process["action"])
-
-            d["kwargs"]["wait"] = False            
-            if "wait" in process["action"]:
-                d["kwargs"]["wait"] = process["action"]["wait"]
-            
-            self.processes.append(d)
+        namespace = process["action"]["namespace"]
+        package = process["action"]["package"]
+        spec = process["action"]["action_spec"]
         
-        except Exception as e:
-            self.event_cb(self.init_err_str.format("action", str(e)), "warn")
-            self.processes.append("not_initialised")
-            
+        exec("from {}.msg import {} as action_spec".format(package, spec))
+        exec("from {}.msg import {} as goal_class".format(package, spec[:-6] + "Goal"))
+        
+        # the client is shared by the processes sending goals to the same server, each
+        # goal being tracked by its own handle
+        action_client = get_process_registry().get("action", (namespace, action_spec._type), 
+                                                   functools.partial(actionlib.ActionClient, namespace, action_spec))
+        wait = action_client.wait_for_server(rospy.Duration(5.0))
+        if not wait:
+            raise ProcessNotAvailable("Action server with namespace '{}' and action spec '{}' not available".format(namespace, spec))
+
+        goal = goal_class()
+        for code in compile_args(process["action"]["goal_args"], "goal_args"): 
+            exec(code, globals(), {"goal": goal})
+            
+        kwargs = {}
+        kwargs["spec"] = spec
+        kwargs["action_client"] = action_client
+        kwargs["goal"] = goal
+        kwargs["verbose"] = self.is_verbose(process["action"])
+
+        kwargs["wait"] = False            
+        if "wait" in process["action"]:
+            kwargs["wait"] = process["action"]["wait"]
+
+        # longest wait for the result, the goal is not cancelled when it is over
+        kwargs["timeout"] = 60.0
+        if "timeout" in process["action"]:
+            kwargs["timeout"] = process["action"]["timeout"]
         
+        return Process("action", self.action, kwargs, self.is_verbose(process["action"]),
+                       ("Sending goal for action with spec '{}'".format(spec), "info", goal), target=namespace)
+
+
     def init_sleep(self, process):
         
-        try:
-            d = {}
-            d["name"] = "sleep"
-            d["verbose"] = self.is_verbose(process["sleep"])
-            d["def_msg"] = ("Sentor sleeping for {} seconds".format(process["sleep"]["duration"]), "info", "")
-            d["func"] = "self.sleep(**kwargs)"
-            d["kwargs"] = {}
-            d["kwargs"]["duration"] = process["sleep"]["duration"]
-            
-            self.processes.append(d)
+        kwargs = {}
+        kwargs["duration"] = process["sleep"]["duration"]
+        
+        return Process("sleep", self.sleep, kwargs, self.is_verbose(process["sleep"]),
+                       ("Sentor sleeping for {} seconds".format(process["sleep"]["duration"]), "info", ""))
+
 
-        except Exception as e:
-            self.event_cb(self.init_err_str.format("sleep", str(e)), "warn")
-            self.processes.append("not_initialised")            
-            
-            
     def init_shell(self, process):
         
-        try:
-            d = {}
-            d["name"] = "shell"
-            d["verbose"] = self.is_verbose(process["shell"])
-            d["def_msg"] = ("Executing shell commands {}".format(process["shell"]["cmd_args"]), "info", "")
-            d["func"] = "self.shell(**kwargs)"
-            d["kwargs"] = {}
-            d["kwargs"]["cmd_args"] = process["shell"]["cmd_args"]
-            
-            self.processes.append(d)
+        kwargs = {}
+        kwargs["cmd_args"] = process["shell"]["cmd_args"]
+        kwargs["verbose"] = self.is_verbose(process["shell"])
+
+        # by default the next process runs once the commands have exited or timed out,
+        # with wait set to False it runs at once
+        kwargs["wait"] = True
+        if "wait" in process["shell"]:
+            kwargs["wait"] = process["shell"]["wait"]
 
-        except Exception as e:
-            self.event_cb(self.init_err_str.format("shell", str(e)), "warn")
-            self.processes.append("not_initialised")
+        options = {}
+        for option in ("timeout", "kill_policy", "kill_timeout", "output_lines", "chunk_lines", "max_chunks"):
+            if option in process["shell"]:
+                options[option] = process["shell"][option]
+        if options.get("kill_policy", "terminate") not in KILL_POLICIES:
+            raise ValueError("Kill policy '{}' not supported, use one of {}".format(options["kill_policy"], KILL_POLICIES))
+        kwargs["options"] = options
+        
+        return Process("shell", self.shell, kwargs, self.is_verbose(process["shell"]),
+                       ("Executing shell commands {}".format(process["shell"]["cmd_args"]), "info", ""), 
+                       target=tuple(process["shell"]["cmd_args"]), timed=kwargs["wait"])
 
 
     def init_log(self, process):
         
-        try:            
-            d = {}
-            d["name"] = "log"
-            d["verbose"] = False
-            d["func"] = "self.log(**kwargs)"
-            d["kwargs"] = {}
-            d["kwargs"]["message"] = process["log"]["message"]
-            d["kwargs"]["level"] = process["log"]["level"]
-            
-            if "msg_args" in process["log"]:
-                d["kwargs"]["msg_args"] = process["log"]["msg_args"]
-            else:
-                d["kwargs"]["msg_args"] = None                
-            
-            self.processes.append(d)
+        kwargs = {}
+        kwargs["message"] = "CUSTOM MSG: " + process["log"]["message"]
+        kwargs["level"] = process["log"]["level"]
+        
+        if "msg_args" in process["log"]:
+            kwargs["msg_args"] = compile_args(process["log"]["msg_args"], "msg_args")
+        else:
+            kwargs["msg_args"] = None                
+        
+        return Process("log", self.log, kwargs, pass_msg=True)
+
 
-        except Exception as e:
-            self.event_cb(self.init_err_str.format("log", str(e)), "warn")
-            self.processes.append("not_initialised")
-            
-            
     def init_reconf(self, process):
         
-        try:
-            default_params = []
-            for param in process["reconf"]["params"]:
-                rcnfclient = dynamic_reconfigure.client.Client(param["namespace"], timeout=5.0)
-                default_config = rcnfclient.get_configuration()
-                default_params.append(default_config[param["name"]])
-            
-            d = {}
-            d["name"] = "reconf"
-            d["verbose"] = self.is_verbose(process["reconf"])
-            d["def_msg"] = ("Reconfiguring parameters: {}".format(process["reconf"]["params"]), "info", "")
-            d["func"] = "self.reconf(**kwargs)"
-            d["kwargs"] = {}
-            d["kwargs"]["params"] = process["reconf"]["params"]
-            d["kwargs"]["default_params"] = default_params
-            
-            self.processes.append(d)
+        # the parameters of a namespace are set at once, None restores the default
+        updates = collections.OrderedDict()
+        for param in process["reconf"]["params"]:
+            value = param["value"] if param["value"] != "_default" else None
+            updates.setdefault(param["namespace"], []).append((param["name"], value))
 
-        except Exception as e:
-            self.event_cb(self.init_err_str.format("reconf", str(e)), "warn")
-            self.processes.append("not_initialised")
+        clients = get_reconfigure_clients()
+        for namespace, params in updates.items():
+            try:
+                clients.capture_defaults(namespace, [name for name, _ in params], timeout=5.0)
+            except rospy.ROSException as e:
+                raise ProcessNotAvailable("Reconfigure server '{}' not available: {}".format(namespace, e))
+        
+        kwargs = {}
+        kwargs["updates"] = updates
+        
+        return Process("reconf", self.reconf, kwargs, self.is_verbose(process["reconf"]),
+                       ("Reconfiguring parameters: {}".format(process["reconf"]["params"]), "info", ""), 
+                       target=tuple(updates.keys()))
 
 
     def init_lock_acquire(self, process):
         
-        try:
-            d = {}
-            d["name"] = "lock_acquire"
-            d["verbose"] = False
-            d["func"] = "self.lock_acquire()"
-            d["kwargs"] = {}
-            
-            self.processes.append(d)
+        return Process("lock_acquire", self.lock_acquire, {})
 
-        except Exception as e:
-            self.event_cb(self.init_err_str.format("lock_acquire", str(e)), "warn")
-            self.processes.append("not_initialised")
-            
 
     def init_lock_release(self, process):
         
-        try:
-            d = {}
-            d["name"] = "lock_release"
-            d["verbose"] = False
-            d["func"] = "self.lock_release()"
-            d["kwargs"] = {}
-            
-            self.processes.append(d)
+        return Process("lock_release", self.lock_release, {})
+
 
-        except Exception as e:
-            self.event_cb(self.init_err_str.format("lock_release", str(e)), "warn")
-            self.processes.append("not_initialised")
-            
-            
     def init_custom(self, process):
         
-        try:
-            package = process["custom"]["package"]
-            name = process["custom"]["name"]
-            
-            _file = name
-            if "file" in process["custom"]:
-                _file = process["custom"]["file"]
-            
-            exec("from {}.{} import {} as custom_proc".format(package, _file, name))
-            
-            if "init_args" in process["custom"]:
-                args = process["custom"]["init_args"] 
-                cp = custom_proc(*args)
-            else:
-                cp = custom_proc()
-            
-            d = {}
-            d["name"] = "custom"
-            d["verbose"] = self.is_verbose(process["custom"])
-            d["def_msg"] = ("Executing custom process '{}' from package '{}'".format(name, package), "info", "")
-            d["func"] = "self.custom(**kwargs)"
-            d["kwargs"] = {}
-            d["kwargs"]["cp"] = cp
-            
-            d["kwargs"]["args"] = None
-            if "run_args" in process["custom"]:
-                d["kwargs"]["args"] = process["custom"]["run_args"]
-            
-            self.processes.append(d)
-            
-        except Exception as e:
-            self.event_cb(self.init_err_str.format("custom", str(e)), "warn")
-            self.processes.append("not_initialised")
+        package = process["custom"]["package"]
+        name = process["custom"]["name"]
+        
+        _file = name
+        if "file" in process["custom"]:
+            _file = process["custom"]["file"]
+        
+        exec("from {}.{} import {} as custom_proc".format(package, _file, name))
+        
+        args = []
+        if "init_args" in process["custom"]:
+            args = process["custom"]["init_args"] 
 
+        # the instance is shared by the processes with the same class and init args
+        cp = get_process_registry().get("custom", (package, _file, name, repr(args)), 
+                                        functools.partial(custom_proc, *args))
+        
+        kwargs = {}
+        kwargs["cp"] = cp
+        
+        kwargs["args"] = None
+        if "run_args" in process["custom"]:
+            kwargs["args"] = process["custom"]["run_args"]
         
+        return Process("custom", self.custom, kwargs, self.is_verbose(process["custom"]),
+                       ("Executing custom process '{}' from package '{}'".format(name, package), "info", ""), 
+                       target=(package, _file, name, repr(args)))
+
+
     def get_name(self, name):
         
         env_name = os.environ.get(name)
@@ -351,99 +497,168 @@ class Executor(object):
         return verbose
             
         
-    def execute(self, msg=None, process_indices=None):
-        
-        self.msg = msg
+    def execute(self, msg=None, process_indices=None, submitted=None):
+        """
+        @param submitted: time the execution was queued at, if it was
+        """
+        metrics = get_executor_metrics()
+        if submitted is not None:
+            metrics.record_wait(self.name, time.time() - submitted)
         
         if process_indices is None:
             indices = self.default_indices
         else:
             indices = process_indices
+
+        if self.min_interval > 0:
+            key = tuple(indices)
+            limiter = self.sequence_limiters.get(key)
+            if limiter is None:
+                limiter = self.sequence_limiters.setdefault(key, RateLimiter(self.min_interval))
+            if not limiter.allow():
+                metrics.record_suppressed(self.name)
+                rospy.logdebug("Execution of processes {} suppressed, last one less than {} seconds ago".format(list(indices), self.min_interval))
+                return
         
         for index in indices:
-            rospy.sleep(0.1) # needed when using slackeros
-            
             process = self.processes[index]
+            if process is None:
+                # waiting for the initialisation would delay the next processes, it is attempted
+                # again at once in the background instead
+                process_type = self.config[index].keys()[0]
+                self.event_cb("Process {} of type '{}' skipped, not initialised yet".format(index, process_type), "warn")
+                metrics.record_skipped(process_type, self.get_config_target(process_type, self.config[index][process_type]))
+                self.submit_init(index)
+                continue
             if process == "not_initialised":
                 continue
             
+            if process.limiter is not None and not process.limiter.allow():
+                metrics.record_suppressed(self.name, process.name, process.target)
+                rospy.logdebug("Process {} of type '{}' suppressed, last run less than {} seconds ago".format(index, process.name, process.limiter.min_interval))
+                continue
+            
+            start = time.time()
+            outcome = "ok"
             try:
-                if process["verbose"] and "def_msg" in process:
-                    self.event_cb(process["def_msg"][0], process["def_msg"][1], process["def_msg"][2])
+                if process.verbose and process.def_msg is not None:
+                    self.event_cb(*process.def_msg)
                     
-                kwargs = process["kwargs"]            
-                eval(process["func"])
+                if process.run(msg) is False:
+                    outcome = "failed"
                 
             except Exception as e:
-                self.event_cb("Unable to execute process of type '{}': {}".format(process["name"], str(e)), "warn")
+                outcome = "timeout" if is_timeout(e) else "failed"
+                self.event_cb("Unable to execute process of type '{}': {}".format(process.name, str(e)), "warn")
+
+            if process.timed:
+                metrics.record(process.name, process.target, time.time() - start, outcome)
             
 
-    def call(self, service_name, service_class, req, verbose, timeout_srv):
+    def call(self, service_name, service_proxy, req, verbose, timeout_srv):
         
-        rospy.wait_for_service(service_name, timeout=timeout_srv)
-        service_client = rospy.ServiceProxy(service_name, service_class)
-        resp = service_client(req)
+        # the connection to the service persists between calls
+        resp = service_proxy.call(req, timeout_srv)
         
         if verbose and resp.success:
             self.event_cb("Call to service '{}' succeeded".format(service_name), "info", req)
         elif not resp.success:
             self.event_cb("Call to service '{}' failed".format(service_name), "warn", req)
+            return False
         
         
     def publish(self, pub, msg):
         pub.publish(msg)
         
         
-    def action(self, spec, action_client, goal, verbose, wait):
+    def action(self, spec, action_client, goal, verbose, wait, timeout):
         
-        self.spec = spec
-        self.goal = goal
-        self.verbose_action = verbose
+        done = Event()
+        def transition_cb(gh):
+            if gh.get_comm_state() != actionlib.CommState.DONE:
+                return
+            with self._goals_lock:
+                if done.isSet():
+                    return
+                done.set()
+                self.goal_handles.discard(gh)
+            self.goal_cb(spec, goal, verbose, gh.get_goal_status(), gh.get_result())
         
-        action_client.send_goal(goal, self.goal_cb)
+        gh = action_client.send_goal(goal, transition_cb)
+        with self._goals_lock:
+            if not done.isSet():
+                self.goal_handles.add(gh)
         
-        if wait:
-            action_client.wait_for_result()
+        if wait and not done.wait(timeout):
+            raise ProcessTimeout("No result for action with spec '{}' after {} seconds".format(spec, timeout))
             
         
     def sleep(self, duration):
         rospy.sleep(duration)
         
         
-    def shell(self, cmd_args):
-        
-        process = subprocess.Popen(cmd_args,
-                     stdout=subprocess.PIPE, 
-                     stderr=subprocess.PIPE)
-                     
-        stdout, stderr = process.communicate()
-        print stdout
+    def shell(self, cmd_args, verbose, wait, options):
         
-        if stderr:
-            self.event_cb("Unable to execute shell commands {}: {}".format(cmd_args, stderr), "warn")
+        def output_cb(lines):
+            self.event_cb("Output of shell commands {}:\n{}".format(cmd_args, "\n".join(lines)), "info")
+
+        results = []
+        def exit_cb(result):
+            results.append(result)
+            outcome = self.shell_exited(cmd_args, result, verbose, report_timeout=not wait)
+            if not wait:
+                get_executor_metrics().record("shell", tuple(cmd_args), result.duration, outcome)
+
+        # the commands run on their own thread, with their output streamed to the events
+        done = get_shell_runner().run(cmd_args, output_cb, exit_cb, **options)
+        if wait:
+            done.wait()
+            if results and results[0].timed_out:
+                raise ProcessTimeout("Shell commands {} timed out after {:.1f} seconds and were killed".format(cmd_args, results[0].duration))
+            return bool(results) and results[0].returncode == 0
+
+
+    def shell_exited(self, cmd_args, result, verbose, report_timeout=True):
+        """
+        report the exit of shell commands
+        @return: outcome for the metrics, 'ok', 'failed' or 'timeout'
+        """
+        if result.tail:
+            omitted = "({} lines omitted)\n".format(result.omitted) if result.omitted else ""
+            self.event_cb("Output of shell commands {}:\n{}{}".format(cmd_args, omitted, "\n".join(result.tail)), "info")
+
+        if result.timed_out:
+            if report_timeout:
+                self.event_cb("Shell commands {} timed out after {:.1f} seconds and were killed".format(cmd_args, result.duration), "warn")
+            return "timeout"
+        elif result.returncode is None:
+            self.event_cb("Unable to execute shell commands {}".format(cmd_args), "warn")
+            return "failed"
+        elif result.returncode != 0:
+            self.event_cb("Shell commands {} exited with code {}".format(cmd_args, result.returncode), "warn")
+            return "failed"
+
+        if verbose:
+            self.event_cb("Shell commands {} exited with code 0 after {:.2f} seconds".format(cmd_args, result.duration), "info")
+        return "ok"
         
     
-    def log(self, message, level, msg_args):
+    def log(self, msg, message, level, msg_args):
         
-        msg = self.msg
         if msg is not None and msg_args is not None:
-            args = [eval(arg) for arg in msg_args]
-            self.event_cb("CUSTOM MSG: " + message.format(*args), level)
+            namespace = {"msg": msg}
+            args = [eval(code, globals(), namespace) for code in msg_args]
+            self.event_cb(message.format(*args), level)
         else:
-            self.event_cb("CUSTOM MSG: " + message, level)
+            self.event_cb(message, level)
             
             
-    def reconf(self, params, default_params):
+    def reconf(self, updates):
         
-        for param, default_param in zip(params, default_params):            
-            rcnfclient = dynamic_reconfigure.client.Client(param["namespace"], timeout=1.0)
-            
-            if param["value"] != "_default":
-                value = param["value"]
-            else:
-                value = default_param
-                
-            rcnfclient.update_configuration({param["name"]: value})
+        # the clients are cached per namespace
+        clients = get_reconfigure_clients()
+        for namespace, params in updates.items():
+            clients.update(namespace, params, timeout=1.0)
             
             
     def lock_acquire(self):
@@ -458,12 +673,12 @@ class Executor(object):
         cp.run(*args) if args is not None else cp.run()
          
         
-    def goal_cb(self, status, result):
+    def goal_cb(self, spec, goal, verbose, status, result):
         
-        if self.verbose_action and status == 3:
-            self.event_cb("Goal achieved for action with spec '{}'".format(self.spec), "info", self.goal)
+        if verbose and status == 3:
+            self.event_cb("Goal achieved for action with spec '{}'".format(spec), "info", goal)
         elif status == 2 or status == 6:
-            self.event_cb("Goal preempted for action with spec '{}'".format(self.spec), "warn", self.goal)
+            self.event_cb("Goal preempted for action with spec '{}'".format(spec), "warn", goal)
         elif status != 3:
-            self.event_cb("Goal failed for action with spec '{}'".format(self.spec), "warn", self.goal)
+            self.event_cb("Goal failed for action with spec '{}'".format(spec), "warn", goal)
 #####################################################################################
\ No newline at end of file
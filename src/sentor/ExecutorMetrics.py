@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#####################################################################################
+from sentor.StreamingHistogram import StreamingHistogram
+from sentor.msg import ExecutorStats
+from sentor.srv import GetExecutorStats, GetExecutorStatsResponse
+from threading import Lock
+import rospy
+
+
+class _ProcessStats(object):
+    __slots__ = ["executions", "failures", "timeouts", "suppressed", "skipped", "times"]
+
+    def __init__(self, window):
+        self.executions = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.suppressed = 0
+        self.skipped = 0
+        self.times = StreamingHistogram(window=window)
+
+
+class ExecutorMetrics(object):
+    """
+    ExecutorMetrics counts and times the processes run by all the executors, per
+    process type and target: executions, failures, timeouts, executions suppressed
+    by a rate limit, executions skipped because the process was not initialised yet
+    and the distribution of the execution time. It also keeps the distribution of the time the process
+    sequences of each queue wait before running, and reports the depth and the
+    executions, drops and coalescing of the queues of the worker pools watched.
+    The distributions cover the last one to two windows, the counters cover the
+    whole run.
+    """
+    def __init__(self, window=60.0):
+        self.window = window
+        self._lock = Lock()
+        self.processes = {}
+        self.queues = {}
+        self.pools = []
+
+    def record(self, process_type, target, duration, outcome="ok"):
+        """
+        @param outcome: 'ok', 'failed' or 'timeout'
+        """
+        key = (process_type, "" if target is None else str(target))
+        with self._lock:
+            stats = self.processes.get(key)
+            if stats is None:
+                stats = self.processes[key] = _ProcessStats(self.window)
+            stats.executions += 1
+            if outcome == "failed":
+                stats.failures += 1
+            elif outcome == "timeout":
+                stats.timeouts += 1
+            stats.times.add(duration, rospy.get_time())
+
+    def record_wait(self, queue, wait):
+        with self._lock:
+            stats = self._get_queue(queue)
+            stats.executions += 1
+            stats.times.add(wait, rospy.get_time())
+
+    def record_suppressed(self, queue, process_type=None, target=None):
+        """
+        count an execution suppressed by a rate limit, of a process if process_type
+        is given else of the process sequence
+        """
+        with self._lock:
+            if process_type is None:
+                self._get_queue(queue).suppressed += 1
+                return
+            key = (process_type, "" if target is None else str(target))
+            stats = self.processes.get(key)
+            if stats is None:
+                stats = self.processes[key] = _ProcessStats(self.window)
+            stats.suppressed += 1
+
+    def record_skipped(self, process_type, target=None):
+        """
+        count an execution skipped because the process was not initialised yet
+        """
+        key = (process_type, "" if target is None else str(target))
+        with self._lock:
+            stats = self.processes.get(key)
+            if stats is None:
+                stats = self.processes[key] = _ProcessStats(self.window)
+            stats.skipped += 1
+
+    def _get_queue(self, queue):
+        # must be called with the lock held
+        stats = self.queues.get(queue)
+        if stats is None:
+            stats = self.queues[queue] = _ProcessStats(self.window)
+        return stats
+
+    def watch_pool(self, pool):
+        """
+        report the queues of a worker pool
+        """
+        with self._lock:
+            if pool not in self.pools:
+                self.pools.append(pool)
+
+    def to_msg(self):
+        msg = ExecutorStats()
+        msg.header.stamp = rospy.Time.now()
+        now = rospy.get_time()
+
+        with self._lock:
+            for (process_type, target), stats in sorted(self.processes.items()):
+                times = stats.times
+                msg.process_types.append(process_type)
+                msg.targets.append(target)
+                msg.executions.append(stats.executions)
+                msg.failures.append(stats.failures)
+                msg.timeouts.append(stats.timeouts)
+                msg.suppressed.append(stats.suppressed)
+                msg.skipped.append(stats.skipped)
+                msg.time_p50.append(times.quantile(0.5, now) or 0.)
+                msg.time_p95.append(times.quantile(0.95, now) or 0.)
+                msg.time_max.append(times.get_max(now))
+
+            for queue, stats in sorted(self.queues.items()):
+                waits = stats.times
+                msg.queues.append(queue)
+                msg.queue_executions.append(stats.executions)
+                msg.queue_suppressed.append(stats.suppressed)
+                msg.queue_wait_p50.append(waits.quantile(0.5, now) or 0.)
+                msg.queue_wait_p95.append(waits.quantile(0.95, now) or 0.)
+                msg.queue_wait_max.append(waits.get_max(now))
+
+            pools = list(self.pools)
+
+        for pool in pools:
+            for queue, (depth, max_depth, executed, dropped, coalesced) in sorted(pool.get_stats().items()):
+                msg.pool_queues.append(str(queue))
+                msg.pool_depth.append(depth)
+                msg.pool_max_depth.append(max_depth)
+                msg.pool_executed.append(executed)
+                msg.pool_dropped.append(dropped)
+                msg.pool_coalesced.append(coalesced)
+
+        return msg
+
+    def advertise(self, pub_rate=1.0):
+        """
+        serve the stats on /sentor/get_executor_stats and, if pub_rate > 0, publish
+        them periodically on /sentor/executor_stats
+        """
+        rospy.Service("/sentor/get_executor_stats", GetExecutorStats, self.get_stats)
+
+        if pub_rate > 0:
+            self.stats_pub = rospy.Publisher("/sentor/executor_stats", ExecutorStats, queue_size=1)
+            rospy.Timer(rospy.Duration(1.0/pub_rate), self.publish_stats)
+
+    def get_stats(self, req):
+        ans = GetExecutorStatsResponse()
+        ans.stats = self.to_msg()
+        ans.success = True
+        return ans
+
+    def publish_stats(self, event=None):
+        self.stats_pub.publish(self.to_msg())
+
+
+_metrics = None
+_metrics_lock = Lock()
+
+def get_executor_metrics():
+    """
+    return the metrics shared by all the executors, creating them on first use
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = ExecutorMetrics()
+        return _metrics
+#####################################################################################
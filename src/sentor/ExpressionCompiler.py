@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+#####################################################################################
+from __future__ import division
+import __future__
+import ast
+import copy
+import rospy, math, numpy
+# imported the packages math and numpy so that they can be used in the lambda expressions
+
+
+class ExpressionError(object):
+    """
+    Result of an expression that raised while being evaluated
+    """
+    __slots__ = ["exc"]
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+# node types that can be evaluated once and shared between expressions
+_PURE_NODES = (ast.Attribute, ast.Subscript, ast.Index, ast.Slice, ast.BinOp, ast.UnaryOp,
+               ast.Compare, ast.BoolOp, ast.Name, ast.Load, ast.operator, ast.unaryop,
+               ast.cmpop, ast.boolop, ast.Num, ast.Str)
+_PURE_CALLS = ("len", "abs", "float", "int", "bool", "round")
+_SCOPE_NODES = (ast.Lambda, ast.ListComp, ast.GeneratorExp, ast.SetComp, ast.DictComp)
+
+_ARG = "_msg"
+_TEMPLATE_FN = "_fused"
+
+
+class ExpressionCompiler(object):
+    """
+    ExpressionCompiler fuses the lambda expressions of a topic into one evaluator.
+    Field accesses and sub-expressions used more than once are computed once per
+    message, and every expression result is returned at once.
+    """
+    def __init__(self, lambda_fn_strs):
+        self.lambda_fn_strs = lambda_fn_strs
+
+        # indices of the expressions fused, the others must be evaluated on their own
+        self.fused_indices = []
+        bodies = []
+        for i, lambda_fn_str in enumerate(lambda_fn_strs):
+            body = _parse_lambda(lambda_fn_str)
+            if body is not None:
+                self.fused_indices.append(i)
+                bodies.append(body)
+
+        self.shared = []
+        self.fused = None
+        self.fallback = []
+        if bodies:
+            fallback_bodies = [copy.deepcopy(body) for body in bodies]
+            definitions = self._eliminate_common_subexpressions(bodies)
+            self.fused = self._build(definitions, bodies)
+            self.fallback = [self._build([], [body]) for body in fallback_bodies]
+            self.fallback = [lambda msg, fn=fn: _unwrap(fn(msg)) for fn in self.fallback]
+
+    def _eliminate_common_subexpressions(self, bodies):
+        """
+        hoist the largest sub-expression used more than once into a variable until
+        none is left, and return the ordered list of (name, definition)
+        """
+        definitions = []
+        while True:
+            counts = {}
+            for tree in bodies + [d for _, d in definitions]:
+                for node in _candidates(tree):
+                    key = ast.dump(node)
+                    count, size, _ = counts.get(key, (0, _size(node), node))
+                    counts[key] = (count + 1, size, node)
+
+            shared = [(size, key, node) for key, (count, size, node) in counts.items() if count > 1]
+            if not shared:
+                break
+
+            _, key, node = max(shared, key=lambda s: s[0])
+            name = "_c{}".format(len(definitions))
+            self.shared.append(key)
+
+            replacer = _Replacer(key, name)
+            bodies[:] = [replacer.visit(tree) for tree in bodies]
+            definitions = [(n, replacer.visit(d)) for n, d in definitions]
+            definitions.append((name, copy.deepcopy(node)))
+
+        # a definition may use variables hoisted after it
+        ordered = []
+        done = set()
+        defs = dict(definitions)
+        def visit(name):
+            if name in done:
+                return
+            done.add(name)
+            for dep in _names(defs[name]):
+                if dep in defs:
+                    visit(dep)
+            ordered.append((name, defs[name]))
+        for name, _ in definitions:
+            visit(name)
+
+        return ordered
+
+    def _build(self, definitions, bodies):
+        # template source, the placeholders are replaced by the expression trees.
+        # if a shared value raises the caller falls back to evaluating each
+        # expression on its own, so that only the expressions using it fail
+        lines = ["def {}({}, _ExpressionError=_ExpressionError):".format(_TEMPLATE_FN, _ARG)]
+        placeholders = {}
+        if definitions:
+            lines += ["    try:"]
+            for i, (name, definition) in enumerate(definitions):
+                placeholder = "__d{}__".format(i)
+                placeholders[placeholder] = definition
+                lines += ["        {} = {}".format(name, placeholder)]
+            lines += ["    except Exception:",
+                      "        return None"]
+
+        for i, body in enumerate(bodies):
+            placeholder = "__e{}__".format(i)
+            placeholders[placeholder] = body
+            lines += ["    try:",
+                      "        _r{} = {}".format(i, placeholder),
+                      "    except Exception as e:",
+                      "        _r{} = _ExpressionError(e)".format(i)]
+        lines += ["    return [{}]".format(", ".join("_r{}".format(i) for i in range(len(bodies))))]
+
+        module = ast.parse("\n".join(lines))
+        module = _Placeholders(placeholders).visit(module)
+        ast.fix_missing_locations(module)
+
+        code = compile(module, "<sentor expressions>", "exec",
+                       __future__.division.compiler_flag, True)
+        namespace = {"rospy": rospy, "math": math, "numpy": numpy,
+                     "_ExpressionError": ExpressionError}
+        exec(code, namespace)
+        return namespace[_TEMPLATE_FN]
+
+    def evaluate(self, msg):
+        """
+        @return: list with the result of each fused expression, in the order of
+                 fused_indices, or an ExpressionError if the expression raised
+        """
+        results = self.fused(msg)
+        if results is None:
+            results = []
+            for fn in self.fallback:
+                try:
+                    results.append(fn(msg))
+                except Exception as e:
+                    results.append(ExpressionError(e))
+        return results
+
+
+def _parse_lambda(lambda_fn_str):
+    """
+    return the body of a single argument lambda with the argument renamed, or None if
+    the expression cannot be fused
+    """
+    try:
+        fn = ast.parse(lambda_fn_str.strip(), mode="eval").body
+    except SyntaxError:
+        return None
+
+    if not isinstance(fn, ast.Lambda) or len(fn.args.args) != 1 or fn.args.vararg or fn.args.kwarg:
+        return None
+    if any(isinstance(node, _SCOPE_NODES) for node in ast.walk(fn.body)):
+        return None
+
+    arg = fn.args.args[0]
+    arg_name = getattr(arg, "arg", None) or getattr(arg, "id", None)
+    if any(isinstance(node, ast.Name) and node.id.startswith("_") and node.id != arg_name
+           for node in ast.walk(fn.body)):
+        # could clash with the generated names
+        return None
+
+    return _Renamer(arg_name, _ARG).visit(fn.body)
+
+
+def _is_pure(node):
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            if child.keywords or getattr(child, "starargs", None) or getattr(child, "kwargs", None):
+                return False
+            func = child.func
+            if isinstance(func, ast.Name) and func.id in _PURE_CALLS:
+                continue
+            if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "math":
+                continue
+            return False
+        elif isinstance(child, ast.expr_context) and not isinstance(child, ast.Load):
+            return False
+        elif not isinstance(child, _PURE_NODES) and not isinstance(child, (ast.Call, ast.expr_context)):
+            return False
+    return True
+
+
+def _candidates(tree):
+    """
+    sub-expressions that depend on the message and can be shared
+    """
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.expr) or isinstance(node, ast.Name):
+            continue
+        names = _names(node)
+        if (_ARG in names or any(n.startswith("_c") for n in names)) and _is_pure(node):
+            yield node
+
+
+def _names(node):
+    return set(n.id for n in ast.walk(node) if isinstance(n, ast.Name))
+
+
+def _size(node):
+    return sum(1 for _ in ast.walk(node))
+
+
+def _unwrap(results):
+    if isinstance(results[0], ExpressionError):
+        raise results[0].exc
+    return results[0]
+
+
+class _Renamer(ast.NodeTransformer):
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+
+    def visit_Name(self, node):
+        if node.id == self.old:
+            return ast.copy_location(ast.Name(id=self.new, ctx=node.ctx), node)
+        return node
+
+
+class _Replacer(ast.NodeTransformer):
+
+    def __init__(self, key, name):
+        self.key = key
+        self.name = name
+
+    def visit(self, node):
+        if isinstance(node, ast.expr) and ast.dump(node) == self.key:
+            return ast.copy_location(ast.Name(id=self.name, ctx=ast.Load()), node)
+        return ast.NodeTransformer.visit(self, node)
+
+
+class _Placeholders(ast.NodeTransformer):
+
+    def __init__(self, placeholders):
+        self.placeholders = placeholders
+
+    def visit_Name(self, node):
+        if node.id in self.placeholders:
+            return self.placeholders[node.id]
+        return node
+#####################################################################################
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#####################################################################################
+from threading import Lock
+import socket
+import time
+import rospy
+import rosgraph
+import roslib.message
+
+
+class MasterSnapshot(object):
+    """
+    MasterSnapshot holds a copy of the ROS master graph (topic types and publishers)
+    taken with one getSystemState and one getTopicTypes call, shared by all the
+    monitors and mappers instead of querying the master once per topic
+    """
+    def __init__(self, caller_id, min_refresh_interval=1.0):
+        self.master = rosgraph.Master(caller_id)
+        self.min_refresh_interval = min_refresh_interval
+
+        self._lock = Lock()
+        self.topic_types = {}
+        self.publishers = {}
+        self.msg_classes = {}
+        self.stamp = None
+
+    def refresh(self, force=False):
+        """
+        update the snapshot from the master, at most once per min_refresh_interval
+        unless forced
+        @return: set of topics advertised since the previous snapshot, or None if
+                 the snapshot was not refreshed
+        """
+        with self._lock:
+            now = time.time()
+            if not force and self.stamp is not None and now - self.stamp < self.min_refresh_interval:
+                return None
+
+            try:
+                pubs, _, _ = self.master.getSystemState()
+                topic_types = dict(self.master.getTopicTypes())
+            except (socket.error, rosgraph.MasterException) as e:
+                rospy.logwarn("Unable to get the system state from the ROS master: %s" % e)
+                return None
+
+            publishers = dict((topic, nodes) for topic, nodes in pubs)
+            new_topics = set(t for t in topic_types if t not in self.topic_types)
+
+            self.topic_types = topic_types
+            self.publishers = publishers
+            self.stamp = now
+
+            return new_topics
+
+    def _ensure(self):
+        if self.stamp is None:
+            self.refresh(force=True)
+
+    def resolve_topic(self, topic_name):
+        """
+        return (real topic, topic type) for a topic name, where the real topic may be
+        a parent of the name when it refers to a field, or (None, None) if the topic
+        is not published
+        """
+        self._ensure()
+        topic_name = rospy.resolve_name(topic_name)
+
+        for attempt in range(2):
+            topic_types = self.topic_types
+
+            if topic_name in topic_types:
+                return topic_name, topic_types[topic_name]
+
+            # e.g. /odom/pose/pose refers to a field of /odom
+            matches = [t for t in topic_types if topic_name.startswith(t + "/")]
+            if matches:
+                real_topic = max(matches, key=len)
+                return real_topic, topic_types[real_topic]
+
+            if attempt == 0 and self.refresh() is None:
+                break
+
+        return None, None
+
+    def get_topic_class(self, topic_name):
+        """
+        same as rostopic.get_topic_class(topic_name, blocking=False), using the snapshot
+        @return: (message class, real topic)
+        """
+        real_topic, topic_type = self.resolve_topic(topic_name)
+        if real_topic is None:
+            return None, None
+
+        msg_class = self.msg_classes.get(topic_type)
+        if msg_class is None:
+            msg_class = roslib.message.get_message_class(topic_type)
+            if msg_class is None:
+                raise ValueError("Cannot load message class for type '{}' of topic {}".format(topic_type, real_topic))
+            self.msg_classes[topic_type] = msg_class
+
+        return msg_class, real_topic
+
+    def get_publishers(self, topic_name):
+        """
+        return the nodes publishing a topic
+        """
+        self._ensure()
+        return list(self.publishers.get(topic_name, []))
+
+
+_snapshot = None
+_snapshot_lock = Lock()
+
+def get_master_snapshot():
+    """
+    return the master snapshot shared by all the monitors, creating it on first use
+    """
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None:
+            _snapshot = MasterSnapshot(rospy.get_name())
+        return _snapshot
+#####################################################################################
@@ -7,60 +7,173 @@ Created on Fri Dec  6 08:51:15 2019
 #####################################################################################
 from __future__ import division
 import rospy
-from sentor.msg import Monitor, MonitorArray
-from threading import Event
+from sentor.msg import Monitor, MonitorArray, MonitorDelta
+from sentor.srv import GetMonitors, GetMonitorsResponse
+from threading import Event, Lock
+import collections
+import copy
 
 
 class MultiMonitor(object):
-    
-    
-    def __init__(self, rate=10):
-        
+    """
+    MultiMonitor publishes the safety critical conditions of all the monitors on
+    /sentor/monitors as soon as one of them changes, the monitors pushing their
+    transitions. Optionally only the changed conditions are also published on
+    /sentor/monitors_delta, with a sequence number incremented on every change so
+    that a consumer missing one can get a full snapshot from /sentor/get_monitors.
+    The deltas then carry the transitions, and the full array is published at most
+    full_rate times per second, only if something changed.
+    """
+
+    def __init__(self, delta=False, full_rate=1.0):
+
         self.topic_monitors = []
         self._stop_event = Event()
-        self.error_code = []
-        
+        self._lock = Lock()
+
+        # (monitor, expression): Monitor msg, in the order the conditions were added
+        self.conditions = collections.OrderedDict()
+        self.seq = 0
+        self.changed = []
+        self.published_seq = None
+        self.full_seq = None
+        # serialises the full publishes made outside of the lock
+        self._full_lock = Lock()
+
         self.monitors_pub = rospy.Publisher("/sentor/monitors", MonitorArray, latch=True, queue_size=1)
-        
-        rospy.Timer(rospy.Duration(1.0/rate), self.cb)
+
+        self.delta_pub = None
+        if delta:
+            self.delta_pub = rospy.Publisher("/sentor/monitors_delta", MonitorDelta, queue_size=100)
+
+        # without deltas every transition is published in full
+        self.full_rate_limited = delta and full_rate > 0
+        if self.full_rate_limited:
+            rospy.Timer(rospy.Duration(1.0/full_rate), self.full_cb)
+
+        rospy.Service("/sentor/get_monitors", GetMonitors, self.get_monitors)
 
 
     def register_monitors(self, topic_monitor):
         self.topic_monitors.append(topic_monitor)
-        
-        
-    def cb(self, event=None):
-        
-        if not self._stop_event.isSet():
-            
-            error_code_new = [monitor.crit_conditions[expr]["safe"] for monitor in self.topic_monitors for expr in monitor.crit_conditions]
-            
-            if error_code_new != self.error_code:
-                self.error_code = error_code_new
-                
+
+        with self._lock:
+            for expr in topic_monitor.crit_conditions:
+                self._add(topic_monitor, expr)
+
+        topic_monitor.register_condition_cb(self.condition_cb)
+
+
+    def _add(self, topic_monitor, expr):
+        # must be called with the lock held
+        condition = Monitor()
+        condition.topic = topic_monitor.topic_name
+        condition.expression = expr
+        condition.safe = topic_monitor.crit_conditions[expr]["safe"]
+        condition.tags = topic_monitor.crit_conditions[expr]["tags"]
+        self.conditions[(topic_monitor, expr)] = condition
+        return condition
+
+
+    def condition_cb(self, topic_monitor, expr, safe):
+
+        with self._lock:
+            condition = self.conditions.get((topic_monitor, expr))
+            if condition is None:
+                # added once the topic was published
+                condition = self._add(topic_monitor, expr)
+            elif condition.safe == safe:
+                return
+            condition.safe = safe
+
+            self.seq += 1
+            self.changed.append(condition)
+
+            if not self._stop_event.isSet():
+                self._publish()
+
+
+    def _publish(self):
+        # must be called with the lock held, so that the messages are published in order
+        stamp = rospy.Time.now()
+
+        if not self.full_rate_limited:
+            conditions = MonitorArray()
+            conditions.header.stamp = stamp
+            conditions.monitors = list(self.conditions.values())
+            self.monitors_pub.publish(conditions)
+            self.full_seq = self.seq
+
+        if self.delta_pub is not None and self.changed:
+            # a condition changed more than once is sent once, with its latest state
+            delta = MonitorDelta()
+            delta.header.stamp = stamp
+            delta.seq = self.seq
+            delta.monitors = list(collections.OrderedDict((id(c), c) for c in self.changed).values())
+            self.delta_pub.publish(delta)
+
+        self.changed = []
+        self.published_seq = self.seq
+
+
+    def _publish_full(self):
+        # the array is copied under the lock but serialised outside of it, the full
+        # publishes being kept in order by their own lock
+        with self._full_lock:
+            with self._lock:
+                if self.full_seq == self.seq:
+                    return
                 conditions = MonitorArray()
                 conditions.header.stamp = rospy.Time.now()
-                
-                count = 0                
-                for monitor in self.topic_monitors:
-                    topic_name = monitor.topic_name
-                    
-                    for expr in monitor.crit_conditions:
-                        condition = Monitor()
-                        condition.topic = topic_name
-                        condition.expression = expr
-                        condition.safe = self.error_code[count]
-                        condition.tags = monitor.crit_conditions[expr]["tags"]
-                        conditions.monitors.append(condition)
-                        count+=1
-                        
-                self.monitors_pub.publish(conditions)
-                        
-                
+                conditions.monitors = copy.deepcopy(list(self.conditions.values()))
+                self.full_seq = self.seq
+            self.monitors_pub.publish(conditions)
+
+
+    def full_cb(self, event=None):
+
+        if self._stop_event.isSet():
+            return
+
+        self._publish_full()
+
+
+    def publish_monitors(self):
+        """
+        publish all the conditions, e.g. once the monitors are registered
+        """
+        with self._lock:
+            self._publish()
+
+        if self.full_rate_limited:
+            self._publish_full()
+
+
+    def get_monitors(self, req):
+
+        ans = GetMonitorsResponse()
+        with self._lock:
+            # the response is serialised once returned, after the lock is released
+            ans.monitors.header.stamp = rospy.Time.now()
+            ans.monitors.monitors = copy.deepcopy(list(self.conditions.values()))
+            ans.seq = self.seq
+        ans.success = True
+
+        return ans
+
+
     def stop_monitor(self):
         self._stop_event.set()
 
 
     def start_monitor(self):
         self._stop_event.clear()
-#####################################################################################
\ No newline at end of file
+
+        # publish the changes made while not monitoring
+        with self._lock:
+            if self.published_seq != self.seq:
+                self._publish()
+
+        if self.full_rate_limited:
+            self._publish_full()
+#####################################################################################
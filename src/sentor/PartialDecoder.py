@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+#####################################################################################
+import ast
+import struct
+import rospy
+import roslib.message
+
+
+PRIMITIVES = {"int8": "b", "uint8": "B", "byte": "b", "char": "B", "bool": "B",
+              "int16": "h", "uint16": "H", "int32": "i", "uint32": "I",
+              "int64": "q", "uint64": "Q", "float32": "f", "float64": "d"}
+
+_len_struct = struct.Struct("<I")
+_time_struct = struct.Struct("<II")
+_duration_struct = struct.Struct("<ii")
+
+
+def get_field_paths(lambda_fn_str):
+    """
+    return the field paths (tuples of attribute names) read from the message by a
+    lambda expression, or None if the expression cannot be analysed
+    """
+    try:
+        tree = ast.parse(lambda_fn_str.strip(), mode="eval")
+    except SyntaxError:
+        return None
+
+    fn = tree.body
+    if not isinstance(fn, ast.Lambda) or len(fn.args.args) != 1:
+        return None
+    arg = fn.args.args[0]
+    arg_name = getattr(arg, "arg", None) or getattr(arg, "id", None)
+
+    paths = set()
+
+    def visit(node):
+        if isinstance(node, ast.Attribute):
+            chain = []
+            root = node
+            while isinstance(root, ast.Attribute):
+                chain.append(root.attr)
+                root = root.value
+            if isinstance(root, ast.Name) and root.id == arg_name:
+                paths.add(tuple(reversed(chain)))
+                return True
+        elif isinstance(node, ast.Name) and node.id == arg_name:
+            # the whole message is used, e.g. passed to a function
+            return False
+        elif isinstance(node, ast.Lambda):
+            # nested lambdas may shadow the argument
+            return False
+
+        return all(visit(child) for child in ast.iter_child_nodes(node))
+
+    if not visit(fn.body):
+        return None
+
+    return sorted(paths)
+
+
+class PartialMsg(object):
+    """
+    Holds only the fields of a message that were decoded by a PartialDecoder.
+    Any other field (e.g. read by a log process) triggers a full deserialization.
+    """
+    _root = None
+    _path = ()
+    _buff = None
+    _msg_class = None
+    _full = None
+
+    def __getattr__(self, name):
+        if name.startswith("__") or self._root is None:
+            raise AttributeError(name)
+        return getattr(self._resolve(), name)
+
+    def __str__(self):
+        if self._root is None:
+            return object.__str__(self)
+        return str(self._resolve())
+
+    def _resolve(self):
+        root = self._root
+        if root._full is None:
+            full = root._msg_class()
+            full.deserialize(root._buff)
+            root._full = full
+
+        msg = root._full
+        for field in self._path:
+            msg = getattr(msg, field)
+        return msg
+
+
+class PartialDecoder(object):
+    """
+    PartialDecoder decodes only the fields used by the lambda expressions of a topic
+    directly from the serialized buffer, skipping over everything else
+    """
+    def __init__(self, msg_class, paths):
+        self.msg_class = msg_class
+        self.paths = paths
+
+        tree = {}
+        for path in paths:
+            self._add_path(tree, msg_class, path)
+
+        # nested messages that are only partially decoded
+        self.partial_paths = []
+        self.read = self._message_reader(msg_class, tree, ())
+
+    def deserialize(self, buff):
+        """
+        @param buff: serialized message
+        @type  buff: str
+        @return: PartialMsg with the required fields set
+        """
+        msg, _ = self.read(buff, 0)
+        msg._root = msg
+        msg._buff = buff
+        msg._msg_class = self.msg_class
+
+        for path in self.partial_paths:
+            nested = msg
+            for field in path:
+                nested = getattr(nested, field)
+            nested._root = msg
+
+        return msg
+
+    def _add_path(self, tree, msg_class, path):
+        # walk the message definition, anything past a leaf (e.g. a method of a
+        # decoded value) is applied by the expression itself
+        for i, field in enumerate(path):
+            if field not in msg_class.__slots__:
+                raise ValueError("Message '{}' has no field '{}'".format(msg_class._type, field))
+
+            field_type = msg_class._slot_types[msg_class.__slots__.index(field)]
+            base_type, is_array, _ = _parse_type(field_type)
+
+            if is_array or base_type in PRIMITIVES or base_type in ("string", "time", "duration") \
+                    or i == len(path) - 1:
+                tree[field] = None  # decode the whole field
+                return
+
+            if tree.get(field, {}) is None:
+                return
+            tree = tree.setdefault(field, {})
+            msg_class = _get_class(base_type)
+
+    def _message_reader(self, msg_class, tree, path):
+        """
+        build a reader for a message. tree maps the required field names to a subtree
+        (nested message with some fields required) or None (field fully required)
+        """
+        full = tree is None
+        fields = list(zip(msg_class.__slots__, msg_class._slot_types))
+
+        if not full:
+            if path:
+                self.partial_paths.append(path)
+            # no need to parse beyond the last required field
+            required = [i for i, (name, _) in enumerate(fields) if name in tree]
+            fields = fields[:max(required) + 1] if required else []
+
+        ops = []
+        for name, field_type in fields:
+            if full or name in tree:
+                ops.append((name, self._field_reader(field_type, None if full else tree[name], path + (name,))))
+            else:
+                ops.append((None, self._field_skipper(field_type)))
+
+        def read(buff, pos):
+            msg = PartialMsg()
+            msg._path = path
+            for name, op in ops:
+                if name is None:
+                    pos = op(buff, pos)
+                else:
+                    value, pos = op(buff, pos)
+                    setattr(msg, name, value)
+            return msg, pos
+
+        return read
+
+    def _field_reader(self, field_type, subtree, path):
+        base_type, is_array, array_len = _parse_type(field_type)
+
+        if is_array:
+            element_reader = self._field_reader(base_type, None, path)
+            if base_type in ("uint8", "char"):
+                # uint8[] is deserialized to a str by genpy
+                def read(buff, pos):
+                    n, pos = _read_len(buff, pos, array_len)
+                    return buff[pos:pos + n], pos + n
+            elif base_type in PRIMITIVES:
+                fmt = PRIMITIVES[base_type]
+                size = struct.calcsize("<" + fmt)
+                def read(buff, pos):
+                    n, pos = _read_len(buff, pos, array_len)
+                    value = struct.unpack_from("<%d%s" % (n, fmt), buff, pos)
+                    if base_type == "bool":
+                        value = tuple(bool(v) for v in value)
+                    return value, pos + n * size
+            else:
+                def read(buff, pos):
+                    n, pos = _read_len(buff, pos, array_len)
+                    value = []
+                    for _ in range(n):
+                        element, pos = element_reader(buff, pos)
+                        value.append(element)
+                    return value, pos
+            return read
+
+        if base_type in PRIMITIVES:
+            s = struct.Struct("<" + PRIMITIVES[base_type])
+            if base_type == "bool":
+                return lambda buff, pos: (bool(s.unpack_from(buff, pos)[0]), pos + s.size)
+            return lambda buff, pos: (s.unpack_from(buff, pos)[0], pos + s.size)
+
+        if base_type == "string":
+            def read(buff, pos):
+                n, pos = _read_len(buff, pos, None)
+                return buff[pos:pos + n], pos + n
+            return read
+
+        if base_type == "time":
+            return lambda buff, pos: (rospy.Time(*_time_struct.unpack_from(buff, pos)), pos + 8)
+
+        if base_type == "duration":
+            return lambda buff, pos: (rospy.Duration(*_duration_struct.unpack_from(buff, pos)), pos + 8)
+
+        return self._message_reader(_get_class(base_type), subtree, path)
+
+    def _field_skipper(self, field_type):
+        size = _fixed_size(field_type)
+        if size is not None:
+            return lambda buff, pos: pos + size
+
+        base_type, is_array, array_len = _parse_type(field_type)
+        element_size = _fixed_size(base_type)
+
+        if is_array and element_size is not None:
+            def skip(buff, pos):
+                n, pos = _read_len(buff, pos, array_len)
+                return pos + n * element_size
+            return skip
+
+        if base_type == "string" and not is_array:
+            def skip(buff, pos):
+                n, pos = _read_len(buff, pos, None)
+                return pos + n
+            return skip
+
+        element_skipper = self._field_skipper(base_type) if is_array else None
+
+        if is_array:
+            def skip(buff, pos):
+                n, pos = _read_len(buff, pos, array_len)
+                for _ in range(n):
+                    pos = element_skipper(buff, pos)
+                return pos
+            return skip
+
+        msg_class = _get_class(base_type)
+        skippers = [self._field_skipper(t) for t in msg_class._slot_types]
+        def skip(buff, pos):
+            for skipper in skippers:
+                pos = skipper(buff, pos)
+            return pos
+        return skip
+
+
+def _parse_type(field_type):
+    """
+    return (base type, is array, fixed array length or None)
+    """
+    if field_type.endswith("]"):
+        base_type, length = field_type[:-1].split("[")
+        return base_type, True, int(length) if length else None
+    return field_type, False, None
+
+
+def _read_len(buff, pos, array_len):
+    if array_len is not None:
+        return array_len, pos
+    return _len_struct.unpack_from(buff, pos)[0], pos + 4
+
+
+def _fixed_size(field_type):
+    """
+    return the serialized size of a type, or None if it is variable
+    """
+    base_type, is_array, array_len = _parse_type(field_type)
+    if is_array:
+        if array_len is None:
+            return None
+        element_size = _fixed_size(base_type)
+        return None if element_size is None else element_size * array_len
+
+    if base_type in PRIMITIVES:
+        return struct.calcsize("<" + PRIMITIVES[base_type])
+    if base_type in ("time", "duration"):
+        return 8
+    if base_type == "string":
+        return None
+
+    size = 0
+    for t in _get_class(base_type)._slot_types:
+        field_size = _fixed_size(t)
+        if field_size is None:
+            return None
+        size += field_size
+    return size
+
+
+def _get_class(msg_type):
+    if msg_type == "Header":
+        msg_type = "std_msgs/Header"
+    msg_class = roslib.message.get_message_class(msg_type)
+    if msg_class is None:
+        raise ValueError("Cannot load message class for type '{}'".format(msg_type))
+    return msg_class
+#####################################################################################
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+#####################################################################################
+from threading import Lock
+import collections
+
+
+class ProcessRegistry(object):
+    """
+    ProcessRegistry shares the handles of the processes (action clients, publishers,
+    custom process instances) between all the executors, so that a handle is created
+    once per resolved target however many monitors use it. Each process keeps its
+    own goal, message or arguments.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.handles = {}
+        self.locks = {}
+        self.requests = collections.Counter()
+
+    def get(self, kind, target, factory):
+        """
+        return the handle of kind for target, creating it with factory() if there is
+        none yet. If factory raises nothing is registered and it is called again next time.
+        """
+        key = (kind, target)
+        with self._lock:
+            self.requests[kind] += 1
+            handle = self.handles.get(key)
+            if handle is not None:
+                return handle
+            lock = self.locks.setdefault(key, Lock())
+
+        # creating a handle may block, e.g. waiting for an action server
+        with lock:
+            handle = self.handles.get(key)
+            if handle is None:
+                handle = factory()
+                with self._lock:
+                    self.handles[key] = handle
+            return handle
+
+    def get_counts(self):
+        """
+        return {kind: (handles requested, handles created)}
+        """
+        with self._lock:
+            created = collections.Counter(kind for kind, _ in self.handles)
+            return dict((kind, (self.requests[kind], created[kind])) for kind in self.requests)
+
+
+_registry = None
+_registry_lock = Lock()
+
+def get_process_registry():
+    """
+    return the process registry shared by all the executors, creating it on first use
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProcessRegistry()
+        return _registry
+#####################################################################################
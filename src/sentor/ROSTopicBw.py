@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Modified from https://github.com/strawlab/ros_comm/blob/master/tools/rostopic/src/rostopic.py
+"""
+#####################################################################################
+from __future__ import division
+import rospy
+import threading
+import collections
+
+
+class ROSTopicBw(object):
+    """
+    ROSTopicBw receives serialized messages for a topic and computes bandwidth and
+    message size stats over a time window, without deserializing the messages
+    """
+    def __init__(self, topic_name, window_duration=1.0):
+        self.lock = threading.Lock()
+        self.topic_name = topic_name
+        self.window_duration = window_duration
+
+        self.last_stamp = -1.
+        self.reset()
+
+    def reset(self):
+        """
+        clear the window, must be called with the lock held (or before use)
+        """
+        # entries are (receive time, size in bytes)
+        self.sizes = collections.deque()
+        self.max_deque = collections.deque()
+        self.sum = 0
+
+    def callback_bw(self, m):
+        """
+        ros sub callback
+        @param m: serialized message
+        @type  m: rospy.AnyMsg
+        """
+        size = len(m._buff)
+        with self.lock:
+            curr_rostime = rospy.get_rostime()
+
+            # time reset
+            if curr_rostime.is_zero():
+                self.reset()
+                return
+
+            curr = curr_rostime.to_sec()
+            if curr < self.last_stamp:
+                self.reset()
+            self.last_stamp = curr
+
+            self.sizes.append((curr, size))
+            self.sum += size
+
+            max_deque = self.max_deque
+            while max_deque and max_deque[-1][1] <= size:
+                max_deque.pop()
+            max_deque.append((curr, size))
+
+            self.evict(curr)
+
+    def evict(self, curr):
+        """
+        drop the sizes older than the window, amortised O(1)
+        """
+        oldest = curr - self.window_duration
+        while self.sizes and self.sizes[0][0] < oldest:
+            _, size = self.sizes.popleft()
+            self.sum -= size
+        while self.max_deque and self.max_deque[0][0] < oldest:
+            self.max_deque.popleft()
+
+    def get_stats(self):
+        """
+        return (bytes per second, mean message size, max message size, messages per second)
+        over the window, or None if there is no data
+        """
+        with self.lock:
+            curr_rostime = rospy.get_rostime()
+            if not curr_rostime.is_zero():
+                self.evict(curr_rostime.to_sec())
+
+            n = len(self.sizes)
+            if not n:
+                return None
+
+            return (self.sum / self.window_duration, self.sum / n,
+                    self.max_deque[0][1], n / self.window_duration)
+#####################################################################################
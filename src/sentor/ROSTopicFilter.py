@@ -7,6 +7,7 @@
 from __future__ import division
 import rospy, math, numpy
 # imported the packages math and numpy so that they can be used in the lambda expressions
+from sentor.ExpressionCompiler import ExpressionError
 
 class ROSTopicFilter(object):
 
@@ -28,8 +29,12 @@ class ROSTopicFilter(object):
         self.filter_satisfied = False
         self.unread_satisfied = False
         self.value_read = False
+        self.msg = None
+        # listeners are only notified when the filter state changes
+        self.notified_satisfied = False
         self.sat_callbacks = []
         self.unsat_callbacks = []
+        self.sample_callbacks = []
 
     def callback_filter(self, msg):
         if self.lambda_fn is None:
@@ -40,15 +45,39 @@ class ROSTopicFilter(object):
         except Exception as e:
             rospy.logwarn("Exception while evaluating %s: %s" % (self.lambda_fn_str, e))
 
+        self.notify(msg)
+
+    def callback_result(self, result, msg):
+        """
+        same as callback_filter, for an expression already evaluated by an ExpressionCompiler
+        """
+        if isinstance(result, ExpressionError):
+            rospy.logwarn("Exception while evaluating %s: %s" % (self.lambda_fn_str, result.exc))
+        else:
+            self.filter_satisfied = result
+
+        self.notify(msg)
+
+    def notify(self, msg):
+        self.msg = msg
+
         # if the last value was read: set value_read to False
         if self.value_read:
             self.value_read = False
         # else if filter_satisfied
         elif self.filter_satisfied:
             self.unread_satisfied = True
-            # notify the listeners
 
-        if self.filter_satisfied:
+        for func in self.sample_callbacks:
+            func(self.lambda_fn_str, msg, self.filter_satisfied)
+
+        # notify the listeners on transitions only
+        satisfied = bool(self.filter_satisfied)
+        if satisfied == self.notified_satisfied:
+            return
+        self.notified_satisfied = satisfied
+
+        if satisfied:
             for func in self.sat_callbacks:
                 func(self.lambda_fn_str, msg, self.config)
         else:
@@ -78,4 +107,11 @@ class ROSTopicFilter(object):
     def register_unsatisfied_cb(self, func):
 
         self.unsat_callbacks.append(func)
+
+    def register_sample_cb(self, func):
+        """
+        register a callback called on every message with (expression, msg, satisfied),
+        for consumers that need every sample rather than the transitions
+        """
+        self.sample_callbacks.append(func)
 #####################################################################################
\ No newline at end of file
@@ -7,18 +7,22 @@ Modified from https://github.com/strawlab/ros_comm/blob/master/tools/rostopic/sr
 #####################################################################################
 import rospy
 import threading
+import collections
+import array
 import math
 
 class ROSTopicHz(object):
     """
-    ROSTopicHz receives messages for a topic and computes frequency stats
+    ROSTopicHz receives messages for a topic and computes frequency stats.
+    The inter-arrival times of the window are kept in a ring buffer with running
+    sums for the mean and standard deviation, and monotonic deques for the min
+    and max, so that every update and query is O(1).
     """
-    def __init__(self, topic_name, window_size, filter_expr=None):
+    def __init__(self, topic_name, window_size, filter_expr=None, window_duration=None):
         self.lock = threading.Lock()
         self.last_printed_tn = 0
         self.msg_t0 = -1.
         self.msg_tn = 0
-        self.times =[]
         self.filter_expr = filter_expr
         self.topic_name = topic_name
 
@@ -26,6 +30,80 @@ class ROSTopicHz(object):
         if window_size < 0:
             window_size = 50000
         self.window_size = window_size
+        # if set, only the messages received in the last window_duration seconds are kept
+        self.window_duration = window_duration
+
+        # only keep statistics for the last window_size messages so as not to run out of memory
+        self.capacity = max(window_size - 1, 1)
+        self.times = array.array("d", [0.]) * self.capacity
+        self.stamps = array.array("d", [0.]) * self.capacity
+        self.reset()
+
+    def reset(self):
+        """
+        clear the window, must be called with the lock held (or before use)
+        """
+        self.n = 0
+        self.head = 0
+        self.seq = 0
+        self.sum = 0.
+        self.sum_sq = 0.
+        self.min_deque = collections.deque()
+        self.max_deque = collections.deque()
+
+    def pop(self):
+        """
+        drop the oldest inter-arrival time from the window
+        """
+        oldest = self.times[self.head]
+        self.sum -= oldest
+        self.sum_sq -= oldest * oldest
+        self.head = (self.head + 1) % self.capacity
+        self.n -= 1
+
+        first = self.seq - self.n
+        if self.min_deque and self.min_deque[0][0] < first:
+            self.min_deque.popleft()
+        if self.max_deque and self.max_deque[0][0] < first:
+            self.max_deque.popleft()
+
+    def push(self, delta, stamp=0.):
+        """
+        add an inter-arrival time to the window, dropping the oldest when it is full
+        """
+        if self.n == self.capacity:
+            self.pop()
+
+        index = (self.head + self.n) % self.capacity
+        self.times[index] = delta
+        self.stamps[index] = stamp
+        self.n += 1
+        self.sum += delta
+        self.sum_sq += delta * delta
+
+        # entries of the deques are (sequence number, delta)
+        min_deque = self.min_deque
+        while min_deque and min_deque[-1][1] >= delta:
+            min_deque.pop()
+        min_deque.append((self.seq, delta))
+
+        max_deque = self.max_deque
+        while max_deque and max_deque[-1][1] <= delta:
+            max_deque.pop()
+        max_deque.append((self.seq, delta))
+
+        self.seq += 1
+        first = self.seq - self.n
+        if min_deque[0][0] < first:
+            min_deque.popleft()
+        if max_deque[0][0] < first:
+            max_deque.popleft()
+
+        # bound the floating point drift of the running sums, amortised O(1)
+        if self.seq % self.capacity == 0:
+            window = [self.times[(self.head + i) % self.capacity] for i in range(self.n)]
+            self.sum = math.fsum(window)
+            self.sum_sq = math.fsum(x * x for x in window)
 
     def callback_hz(self, m):
         """
@@ -41,29 +119,68 @@ class ROSTopicHz(object):
 
             # time reset
             if curr_rostime.is_zero():
-                if len(self.times) > 0:
+                if self.n > 0:
                     print("time has reset, resetting counters")
-                    self.times = []
+                    self.reset()
                 return
 
             curr = curr_rostime.to_sec()
             if self.msg_t0 < 0 or self.msg_t0 > curr:
                 self.msg_t0 = curr
                 self.msg_tn = curr
-                self.times = []
+                self.reset()
             else:
-                self.times.append(curr - self.msg_tn)
+                self.push(curr - self.msg_tn, curr)
                 self.msg_tn = curr
 
-            #only keep statistics for the last 10000 messages so as not to run out of memory
-            if len(self.times) > self.window_size - 1:
-                self.times.pop(0)
+            self.prune(curr)
+
+    def prune(self, curr):
+        """
+        drop the inter-arrival times older than window_duration at time curr, must be
+        called with the lock held
+        """
+        if self.window_duration is None:
+            return
+        # amortised O(1), each sample is dropped once, at its expiry (see get_expiry)
+        while self.n and self.stamps[self.head] + self.window_duration <= curr:
+            self.pop()
+
+    def get_expiry(self):
+        """
+        return the time at which the oldest inter-arrival time leaves the window, or
+        None if there is none, must be called with the lock held
+        """
+        if self.window_duration is None or not self.n:
+            return None
+        return self.stamps[self.head] + self.window_duration
+
+    def get_stats(self):
+        """
+        return (rate, min_delta, max_delta, std_dev, n) over the window, or None if
+        there is no data, must be called with the lock held
+        """
+        n = self.n
+        if not n:
+            return None
+
+        mean = self.sum / n
+        rate = 1./mean if mean > 0. else 0
+
+        #std dev
+        std_dev = math.sqrt(max(self.sum_sq / n - mean * mean, 0.))
+
+        # min and max
+        max_delta = self.max_deque[0][1]
+        min_delta = self.min_deque[0][1]
+
+        return rate, min_delta, max_delta, std_dev, n
 
     def print_hz(self):
         """
         print the average publishing rate to screen
         """
-        if not self.times:
+        if not self.n:
             return
         elif self.msg_tn == self.last_printed_tn:
             print("no new messages")
@@ -77,18 +194,10 @@ class ROSTopicHz(object):
             # report a count and keep track of last_printed_tn.  This
             # makes it easier for users to see when a publisher dies,
             # so the decay is no longer necessary.
-
-            n = len(self.times)
-            #rate = (n - 1) / (rospy.get_time() - self.msg_t0)
-            mean = sum(self.times) / n
-            rate = 1./mean if mean > 0. else 0
-
-            #std dev
-            std_dev = math.sqrt(sum((x - mean)**2 for x in self.times) /n)
-
-            # min and max
-            max_delta = max(self.times)
-            min_delta = min(self.times)
+            stats = self.get_stats()
+            if stats is None:
+                return
+            rate, min_delta, max_delta, std_dev, n = stats
 
             self.last_printed_tn = self.msg_tn
         print("average rate: %.3f\n\tmin: %.3fs max: %.3fs std dev: %.5fs window: %s"%(rate, min_delta, max_delta, std_dev, n+1))
@@ -97,32 +206,16 @@ class ROSTopicHz(object):
         """
         return the average publishing rate to screen
         """
-        if not self.times:
+        if not self.n:
             return
         elif self.msg_tn == self.last_printed_tn:
             # print("no new messages")
             return None
         with self.lock:
-            #frequency
-
-            # kwc: In the past, the rate decayed when a publisher
-            # dies.  Now, we use the last received message to perform
-            # the calculation.  This change was made because we now
-            # report a count and keep track of last_printed_tn.  This
-            # makes it easier for users to see when a publisher dies,
-            # so the decay is no longer necessary.
-
-            n = len(self.times)
-            #rate = (n - 1) / (rospy.get_time() - self.msg_t0)
-            mean = sum(self.times) / n
-            rate = 1./mean if mean > 0. else 0
-
-            #std dev
-            std_dev = math.sqrt(sum((x - mean)**2 for x in self.times) /n)
-
-            # min and max
-            max_delta = max(self.times)
-            min_delta = min(self.times)
+            stats = self.get_stats()
+            if stats is None:
+                return None
+            rate = stats[0]
 
             self.last_printed_tn = self.msg_tn
         return rate
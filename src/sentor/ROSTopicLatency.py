@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#####################################################################################
+from sentor.StreamingHistogram import StreamingHistogram
+import rospy
+import threading
+import struct
+
+# header.stamp follows the uint32 header.seq at the start of a stamped message
+_STAMP = struct.Struct("<2I")
+_STAMP_OFFSET = 4
+
+
+class ROSTopicLatency(object):
+    """
+    ROSTopicLatency receives serialized messages of a stamped topic and computes the
+    age of header.stamp at reception. The latencies of the last one to two windows
+    are kept in a streaming histogram, giving p50/p95/p99/max with O(1) memory.
+    """
+    def __init__(self, topic_name, window_duration=1.0):
+        self.lock = threading.Lock()
+        self.topic_name = topic_name
+        self.window_duration = window_duration
+
+        self.last_stamp = -1.
+        self.latency = None
+        self.histogram = StreamingHistogram(window=window_duration)
+
+    def reset(self):
+        """
+        clear the window, must be called with the lock held (or before use)
+        """
+        self.latency = None
+        self.histogram.reset()
+
+    def callback_latency(self, m):
+        """
+        ros sub callback
+        @param m: serialized message
+        @type  m: rospy.AnyMsg
+        """
+        secs, nsecs = _STAMP.unpack_from(m._buff, _STAMP_OFFSET)
+        with self.lock:
+            curr_rostime = rospy.get_rostime()
+
+            # time reset
+            if curr_rostime.is_zero():
+                if self.histogram.n > 0:
+                    print("time has reset, resetting latencies")
+                    self.reset()
+                return
+
+            curr = curr_rostime.to_sec()
+            if curr < self.last_stamp:
+                self.reset()
+            self.last_stamp = curr
+
+            if not secs and not nsecs:
+                # not stamped
+                return
+
+            # stamps in the future (unsynchronised clocks) count as no latency
+            self.latency = max(curr - (secs + nsecs * 1e-9), 0.)
+            self.histogram.add(self.latency, curr)
+
+    def get_stats(self):
+        """
+        return (p50, p95, p99, max, n) over the window, or None if there is no data
+        """
+        with self.lock:
+            curr_rostime = rospy.get_rostime()
+            now = None if curr_rostime.is_zero() else curr_rostime.to_sec()
+
+            histogram = self.histogram
+            n = histogram.count(now)
+            if not n:
+                return None
+
+            return (histogram.quantile(0.5), histogram.quantile(0.95),
+                    histogram.quantile(0.99), histogram.get_max(), n)
+
+    def track_quantile(self, q):
+        """
+        make get_quantile(q) O(1) amortised, for a quantile checked on every message
+        """
+        with self.lock:
+            self.histogram.track(q)
+
+    def get_quantile(self, q):
+        """
+        return the q quantile of the latency over the window, or None if there is no data
+        """
+        with self.lock:
+            curr_rostime = rospy.get_rostime()
+            now = None if curr_rostime.is_zero() else curr_rostime.to_sec()
+            return self.histogram.quantile(q, now)
+#####################################################################################
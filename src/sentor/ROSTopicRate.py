@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+#####################################################################################
+from sentor.ROSTopicHz import ROSTopicHz
+from sentor.ROSTopicBw import ROSTopicBw
+from sentor.ROSTopicLatency import ROSTopicLatency
+from sentor.DeadlineScheduler import get_scheduler
+from threading import Lock
+import collections
+import math
+import rospy
+
+
+# condition: (statistic, comparison, unit)
+RATE_CONDITIONS = {"rate below": ("rate", "below", "Hz"),
+                   "rate above": ("rate", "above", "Hz"),
+                   "jitter above": ("std_dev", "above", "seconds"),
+                   "gap above": ("max_delta", "above", "seconds"),
+                   "bandwidth above": ("bytes_per_sec", "above", "bytes/s"),
+                   "latency above": ("latency", "above", "seconds")}
+
+
+class ROSTopicRate(object):
+    """
+    ROSTopicRate checks the publishing rate, jitter (inter-arrival std dev), largest
+    gap, bandwidth or latency quantile of a topic over a time window against a
+    threshold. It has the same interface as ROSTopicFilter so that TopicMonitor
+    handles it like an expression.
+    """
+    def __init__(self, topic_name, condition, value, window, config, bw=None, latency=None, quantile=0.5):
+        self.topic_name = topic_name
+        self.condition = condition
+        self.value = value
+        self.window = window
+        self.config = config
+        self.lambda_fn_str = config["expr"]
+
+        self.stat, self.comparison, self.unit = RATE_CONDITIONS[condition]
+        self.hz = None
+        self.bw = None
+        self.owns_bw = False
+        self.latency = None
+        self.owns_latency = False
+        self.quantile = quantile
+        if self.stat == "latency":
+            # the latency stats may be shared with the topic monitor, which updates them
+            self.latency = latency
+            if latency is None:
+                self.latency = ROSTopicLatency(topic_name, window)
+                self.owns_latency = True
+            self.latency.track_quantile(quantile)
+        elif self.stat == "bytes_per_sec":
+            # the bandwidth stats may be shared with the topic monitor, which updates them
+            self.bw = bw
+            if bw is None:
+                self.bw = ROSTopicBw(topic_name, window)
+                self.owns_bw = True
+        else:
+            self.hz = ROSTopicHz(topic_name, 10000, window_duration=window)
+
+        self.filter_satisfied = False
+        self.notified_satisfied = False
+        # there is no message to report for a rate condition
+        self.msg = None
+        self._lock = Lock()
+        self.sat_callbacks = []
+        self.unsat_callbacks = []
+
+        # without messages the rate drops below / the gap exceeds the threshold
+        # without any message telling so
+        self.deadline = None
+        self.stamps = None
+        self.window_deadline = False
+        if self.stat == "rate" and self.comparison == "below" and value > 0:
+            # the rate is below once fewer than value * window messages remain in the window,
+            # that is a window after the last of the messages needed
+            self.stamps = collections.deque(maxlen=max(1, int(math.ceil(value * window))))
+            self.deadline = get_scheduler().deadline(window, self.deadline_cb)
+        elif self.stat == "max_delta":
+            self.deadline = get_scheduler().deadline(value, self.deadline_cb)
+        elif self.stat == "bytes_per_sec":
+            # the bandwidth decays to zero once the messages stop
+            self.deadline = get_scheduler().deadline(window, self.bandwidth_deadline_cb)
+        elif self.hz is not None:
+            # the samples leave the window once the messages stop, the window is then
+            # re-evaluated when the oldest of them does
+            self.window_deadline = True
+            self.deadline = get_scheduler().deadline(window, self.window_deadline_cb)
+
+    def start(self):
+        if self.stamps is not None:
+            self.stamps.clear()
+            self.deadline.reset(self.window)
+        elif self.window_deadline:
+            # armed by the first samples
+            self.deadline.cancel()
+        elif self.deadline is not None:
+            self.deadline.reset()
+
+    def stop(self):
+        if self.deadline is not None:
+            self.deadline.cancel()
+
+    def callback_rate(self, msg):
+        """
+        ros sub callback, O(1) per message
+        @param msg: serialized message
+        @type  msg: rospy.AnyMsg
+        """
+        if self.stamps is not None:
+            self.stamps.append(rospy.get_time())
+            self.deadline.reset(self.stamps[0] + self.window - self.stamps[-1])
+        elif self.deadline is not None and not self.window_deadline:
+            self.deadline.reset()
+
+        if self.latency is not None:
+            if self.owns_latency:
+                self.latency.callback_latency(msg)
+            latency = self.latency.get_quantile(self.quantile)
+            if latency is not None:
+                self.filter_satisfied = latency > self.value
+                self.notify()
+            return
+
+        if self.bw is not None:
+            if self.owns_bw:
+                self.bw.callback_bw(msg)
+            self.callback_bw()
+            return
+
+        self.hz.callback_hz(msg)
+        with self.hz.lock:
+            stats = self.hz.get_stats()
+            expiry = self.hz.get_expiry()
+        if self.window_deadline and expiry is not None:
+            self.deadline.reset(max(expiry - rospy.get_time(), 0.))
+        if stats is None:
+            return
+        self.callback_hz(stats)
+
+    def callback_hz(self, stats):
+        rate, min_delta, max_delta, std_dev, n = stats
+        value = {"rate": rate, "std_dev": std_dev, "max_delta": max_delta}[self.stat]
+
+        if self.comparison == "below":
+            self.filter_satisfied = value < self.value
+        else:
+            self.filter_satisfied = value > self.value
+
+        self.notify()
+
+    def callback_bw(self):
+        stats = self.bw.get_stats()
+        bytes_per_sec = stats[0] if stats is not None else 0.
+        self.filter_satisfied = bytes_per_sec > self.value
+        self.notify()
+
+    def deadline_cb(self, _):
+        self.filter_satisfied = True
+        self.notify()
+
+    def bandwidth_deadline_cb(self, _):
+        self.callback_bw()
+
+    def window_deadline_cb(self, _):
+        with self.hz.lock:
+            self.hz.prune(rospy.get_time())
+            stats = self.hz.get_stats()
+            expiry = self.hz.get_expiry()
+        if expiry is not None:
+            self.deadline.reset(max(expiry - rospy.get_time(), 0.))
+        if stats is None:
+            # no messages left in the window
+            self.filter_satisfied = False
+            self.notify()
+            return
+        self.callback_hz(stats)
+
+    def notify(self):
+        # notify the listeners on transitions only
+        with self._lock:
+            satisfied = bool(self.filter_satisfied)
+            if satisfied == self.notified_satisfied:
+                return
+            self.notified_satisfied = satisfied
+
+        if satisfied:
+            for func in self.sat_callbacks:
+                func(self.lambda_fn_str, self.msg, self.config)
+        else:
+            for func in self.unsat_callbacks:
+                func(self.lambda_fn_str)
+
+    def register_satisfied_cb(self, func):
+
+        self.sat_callbacks.append(func)
+
+    def register_unsatisfied_cb(self, func):
+
+        self.unsat_callbacks.append(func)
+#####################################################################################
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+#####################################################################################
+from threading import Lock
+import dynamic_reconfigure.client
+import rospy
+
+
+class ReconfigureClients(object):
+    """
+    ReconfigureClients keeps one dynamic_reconfigure client per namespace, shared by
+    all the reconf processes, and applies the parameters of a namespace with a single
+    update_configuration call. It also remembers the value each parameter had before
+    sentor first changed it, which is what '_default' restores. Once restored, the
+    value is captured again before the next change, so the default follows changes
+    made by others in the meantime.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.clients = {}
+        self.locks = {}
+        self.defaults = {}
+
+    def get_client(self, namespace, timeout):
+        with self._lock:
+            client = self.clients.get(namespace)
+            if client is not None:
+                return client
+            lock = self.locks.setdefault(namespace, Lock())
+
+        # connecting may block for timeout, without holding up the other namespaces
+        with lock:
+            client = self.clients.get(namespace)
+            if client is None:
+                client = dynamic_reconfigure.client.Client(namespace, timeout=timeout)
+                with self._lock:
+                    self.clients[namespace] = client
+                    self.defaults[namespace] = {}
+            return client
+
+    def capture_defaults(self, namespace, names, timeout):
+        """
+        remember the current values of the parameters of a namespace, unless already known
+        """
+        client = self.get_client(namespace, timeout)
+        with self.locks[namespace]:
+            self._capture(client, namespace, names, timeout)
+
+    def _capture(self, client, namespace, names, timeout):
+        defaults = self.defaults[namespace]
+        missing = [name for name in names if name not in defaults]
+        if missing:
+            # the client tracks the server's parameter updates, only the first call waits
+            config = client.get_configuration(timeout=timeout)
+            if config is None:
+                # the server did not answer in time
+                raise rospy.ROSException("Timeout getting the configuration of '{}'".format(namespace))
+            for name in missing:
+                defaults[name] = config[name]
+
+    def update(self, namespace, params, timeout):
+        """
+        set the parameters of a namespace at once, where params is a list of
+        (name, value) and a value of None restores the default of the parameter
+        """
+        client = self.get_client(namespace, timeout)
+        with self.locks[namespace]:
+            self._capture(client, namespace, [name for name, value in params if value is not None], timeout)
+
+            defaults = self.defaults[namespace]
+            config = {}
+            for name, value in params:
+                if value is not None:
+                    config[name] = value
+                elif name in defaults:
+                    config[name] = defaults.pop(name)
+
+            if config:
+                client.update_configuration(config)
+
+
+_clients = None
+_clients_lock = Lock()
+
+def get_reconfigure_clients():
+    """
+    return the dynamic_reconfigure clients shared by all the executors, creating them on first use
+    """
+    global _clients
+    with _clients_lock:
+        if _clients is None:
+            _clients = ReconfigureClients()
+        return _clients
+#####################################################################################
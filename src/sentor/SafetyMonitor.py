@@ -9,11 +9,16 @@ from __future__ import division
 import rospy
 from std_msgs.msg import Bool
 from std_srvs.srv import SetBool, SetBoolResponse
-from threading import Event
+from threading import Event, Lock
 
 
 class SafetyMonitor(object):
-    
+    """
+    SafetyMonitor keeps the safety critical conditions of all the monitors that are
+    currently unsafe, the monitors pushing their transitions, and publishes False on
+    /safe_operation as soon as one becomes unsafe. The periodic publish is only a
+    heartbeat of the current state.
+    """
     
     def __init__(self, timeout, rate, auto_tagging, event_cb):
         
@@ -26,12 +31,16 @@ class SafetyMonitor(object):
         self.event_cb = event_cb
         self.topic_monitors = []
         
+        # (monitor, expression) of the unsafe conditions
+        self.unsafe_conditions = set()
+        
         self.timer = None
         self.safe_operation = False        
         self.safe_msg_sent = False
         self.unsafe_msg_sent = False
         
         self._stop_event = Event()
+        self._lock = Lock()
 
         self.safety_pub = rospy.Publisher('/safe_operation', Bool, queue_size=10)
         rospy.Timer(rospy.Duration(1.0/rate), self.safety_pub_cb)
@@ -42,38 +51,75 @@ class SafetyMonitor(object):
     def register_monitors(self, topic_monitor):
         self.topic_monitors.append(topic_monitor)
         
+        with self._lock:
+            for expr, condition in topic_monitor.crit_conditions.items():
+                if not condition["safe"]:
+                    self.unsafe_conditions.add((topic_monitor, expr))
+                    
+        topic_monitor.register_condition_cb(self.condition_cb)
+        
+        
+    def condition_cb(self, topic_monitor, expr, safe):
+        
+        with self._lock:
+            if safe:
+                self.unsafe_conditions.discard((topic_monitor, expr))
+            else:
+                self.unsafe_conditions.add((topic_monitor, expr))
+                
+            if not self._stop_event.isSet():
+                if not safe:
+                    self._unsafe()
+                    self.safety_pub.publish(Bool(self.safe_operation))
+                elif not self.unsafe_conditions:
+                    self._safe()
+        
         
     def safety_pub_cb(self, event=None):
         
         if not self._stop_event.isSet():
 
             if self.topic_monitors:
-                threads_are_safe = [monitor.thread_is_safe for monitor in self.topic_monitors]
+                with self._lock:
+                    if self.unsafe_conditions:
+                        self._unsafe()
+                    else:
+                        self._safe()
+                        
+                    self.safety_pub.publish(Bool(self.safe_operation))
                 
-                if self.auto_tagging and all(threads_are_safe) and self.timer is None:
-                    self.timer = rospy.Timer(rospy.Duration.from_sec(self.timeout), self.timer_cb, oneshot=True)
-                    
-                if not all(threads_are_safe):
-                    if self.timer is not None:
-                        self.timer.shutdown()
-                        self.timer = None
+                
+    def _safe(self):
+        # must be called with the lock held
+        if self.auto_tagging and self.timer is None:
+            self.timer = rospy.Timer(rospy.Duration.from_sec(self.timeout), self.timer_cb, oneshot=True)
+            
+            
+    def _unsafe(self):
+        # must be called with the lock held
+        if self.timer is not None:
+            self.timer.shutdown()
+            self.timer = None
 
-                    self.safe_operation = False                        
-                    if not self.unsafe_msg_sent:
-                        self.event_cb("SAFE OPERATION: FALSE", "error")
-                        self.safe_msg_sent = False
-                        self.unsafe_msg_sent = True
-                        
-                self.safety_pub.publish(Bool(self.safe_operation))
+        self.safe_operation = False                        
+        if not self.unsafe_msg_sent:
+            self.event_cb("SAFE OPERATION: FALSE", "error")
+            self.safe_msg_sent = False
+            self.unsafe_msg_sent = True
                 
                 
     def timer_cb(self, event=None):
         
-        self.safe_operation = True
-        if not self.safe_msg_sent:
-            self.event_cb("SAFE OPERATION: TRUE", "info")
-            self.safe_msg_sent = True
-            self.unsafe_msg_sent = False
+        with self._lock:
+            # a condition may have become unsafe while the timer was firing
+            if self.unsafe_conditions:
+                return
+                
+            self.safe_operation = True
+            if not self.safe_msg_sent:
+                self.event_cb("SAFE OPERATION: TRUE", "info")
+                self.safe_msg_sent = True
+                self.unsafe_msg_sent = False
                                        
         
     def set_safety_tag(self, req):
@@ -93,4 +139,7 @@ class SafetyMonitor(object):
 
     def start_monitor(self):
         self._stop_event.clear()
+        
+        # publish the current state at once rather than at the next heartbeat
+        self.safety_pub_cb()
 #####################################################################################
\ No newline at end of file
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+#####################################################################################
+from threading import Lock, Semaphore
+import rospy
+
+
+class PooledServiceProxy(object):
+    """
+    PooledServiceProxy keeps persistent connections to a service, reused across calls
+    instead of looking the service up and connecting on every call. A persistent
+    proxy cannot be shared by concurrent calls, so each concurrent call takes its own
+    connection, and max_concurrent (if > 0) bounds their number. A connection found
+    closed, or failing because the provider restarted, is replaced.
+    """
+    def __init__(self, service_name, service_class, max_concurrent=0):
+        self.service_name = service_name
+        self.service_class = service_class
+        self.max_concurrent = max_concurrent
+
+        self._lock = Lock()
+        self.idle = []
+        self.semaphore = Semaphore(max_concurrent) if max_concurrent > 0 else None
+        self.connects = 0
+        self.reconnects = 0
+
+    def _connect(self, timeout):
+        rospy.wait_for_service(self.service_name, timeout=timeout)
+        with self._lock:
+            self.connects += 1
+        return rospy.ServiceProxy(self.service_name, self.service_class, persistent=True)
+
+    def _take(self):
+        # health check of the idle connections, dropping those closed by the provider
+        with self._lock:
+            while self.idle:
+                proxy = self.idle.pop()
+                transport = proxy.transport
+                if transport is None or not transport.done:
+                    return proxy
+                proxy.close()
+        return None
+
+    def _release(self, proxy):
+        with self._lock:
+            self.idle.append(proxy)
+
+    def call(self, req, timeout):
+        """
+        call the service with req, waiting at most timeout seconds for it if there is
+        no connection to it yet
+        """
+        if self.semaphore is not None:
+            self.semaphore.acquire()
+        try:
+            proxy = self._take()
+            reused = proxy is not None
+            if not reused:
+                proxy = self._connect(timeout)
+
+            try:
+                resp = proxy(req)
+            except rospy.ServiceException as e:
+                proxy.close()
+                if not reused or "responded with an error" in str(e):
+                    # only transport errors are retried, the service handler must not run twice
+                    raise
+                # the provider may have restarted since the connection was made
+                with self._lock:
+                    self.reconnects += 1
+                proxy = self._connect(timeout)
+                try:
+                    resp = proxy(req)
+                except rospy.ServiceException:
+                    proxy.close()
+                    raise
+
+            self._release(proxy)
+            return resp
+
+        finally:
+            if self.semaphore is not None:
+                self.semaphore.release()
+
+
+class ServiceProxyPool(object):
+    """
+    ServiceProxyPool shares one PooledServiceProxy per service name and type between
+    all the processes
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.proxies = {}
+
+    def get(self, service_name, service_class, max_concurrent=0):
+        key = (service_name, service_class._type)
+        with self._lock:
+            proxy = self.proxies.get(key)
+            if proxy is None:
+                proxy = PooledServiceProxy(service_name, service_class, max_concurrent)
+                self.proxies[key] = proxy
+            elif max_concurrent > 0 and max_concurrent != proxy.max_concurrent:
+                # the limit is per service, the first process calling it sets it
+                rospy.logwarn("Service '{}' already has a limit of {} concurrent calls, ignoring {}".format(
+                    service_name, proxy.max_concurrent, max_concurrent))
+            return proxy
+
+
+_pool = None
+_pool_lock = Lock()
+
+def get_service_proxy_pool():
+    """
+    return the service proxy pool shared by all the executors, creating it on first use
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ServiceProxyPool()
+        return _pool
+#####################################################################################
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+#####################################################################################
+from threading import Thread, Semaphore, Lock, Event, Timer
+import collections
+import subprocess
+import signal
+import time
+import os
+
+
+KILL_POLICIES = ("terminate", "kill")
+
+# longer output lines are truncated
+MAX_LINE_LENGTH = 1000
+
+
+class ShellResult(object):
+    """
+    Outcome of a shell command
+    """
+    __slots__ = ["returncode", "timed_out", "duration", "tail", "omitted"]
+
+    def __init__(self, returncode, timed_out, duration, tail, omitted):
+        self.returncode = returncode
+        self.timed_out = timed_out
+        self.duration = duration
+        # the last lines of output, and how many lines before them were not reported
+        self.tail = tail
+        self.omitted = omitted
+
+
+class ShellRunner(object):
+    """
+    ShellRunner runs the shell commands of all the executors on their own threads,
+    at most max_concurrent at once (the others wait for a slot). A command running
+    longer than its timeout is sent SIGTERM and, if still running kill_timeout
+    seconds later, SIGKILL ('terminate' policy), or SIGKILL straight away ('kill'
+    policy), together with its child processes. The output (stdout and stderr) is
+    reported in chunks of chunk_lines lines, up to max_chunks chunks, and only the
+    last output_lines lines are kept, so that memory is bounded whatever the
+    command prints. The timeouts are in wall-clock time, since the command runs in
+    wall-clock time whatever the ROS clock does.
+    """
+    def __init__(self, max_concurrent=4):
+        self.max_concurrent = max_concurrent
+        self.semaphore = Semaphore(max_concurrent) if max_concurrent > 0 else None
+        self._lock = Lock()
+        self.running = 0
+        self.waiting = 0
+
+    def run(self, cmd_args, output_cb, exit_cb, timeout=60.0, kill_policy="terminate",
+            kill_timeout=5.0, output_lines=100, chunk_lines=20, max_chunks=10):
+        """
+        start a command and return at once
+        @param output_cb: called with each chunk of output lines
+        @param exit_cb: called with the ShellResult once the command has exited
+        @return: event set once exit_cb has returned
+        """
+        if kill_policy not in KILL_POLICIES:
+            raise ValueError("Kill policy '{}' not supported, use one of {}".format(kill_policy, KILL_POLICIES))
+
+        done = Event()
+        thread = Thread(target=self._run, args=(cmd_args, output_cb, exit_cb, timeout, kill_policy, kill_timeout,
+                                                 output_lines, chunk_lines, max_chunks, done))
+        thread.daemon = True
+        thread.start()
+        return done
+
+    def _run(self, cmd_args, output_cb, exit_cb, timeout, kill_policy, kill_timeout,
+             output_lines, chunk_lines, max_chunks, done):
+        with self._lock:
+            self.waiting += 1
+        if self.semaphore is not None:
+            self.semaphore.acquire()
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+
+        timers = []
+        exited = Event()
+        try:
+            start = time.time()
+            try:
+                # in its own process group, so that the children are killed with it
+                process = subprocess.Popen(cmd_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                           preexec_fn=os.setsid)
+            except OSError as e:
+                exit_cb(ShellResult(None, False, time.time() - start, [str(e)], 0))
+                return
+
+            timed_out = []
+            if timeout > 0:
+                def kill():
+                    # the process group may be gone, and its id reused, once the command has exited
+                    if not exited.is_set():
+                        self._signal(process, signal.SIGKILL)
+                def expire():
+                    if exited.is_set():
+                        return
+                    timed_out.append(True)
+                    if kill_policy == "kill":
+                        kill()
+                    else:
+                        self._signal(process, signal.SIGTERM)
+                        self._start_timer(timers, kill_timeout, kill)
+                self._start_timer(timers, timeout, expire)
+
+            tail = collections.deque(maxlen=max(output_lines, 1))
+            chunk = []
+            chunks = 0
+            lines = 0
+            for line in iter(process.stdout.readline, b""):
+                line = line.rstrip("\n")[:MAX_LINE_LENGTH]
+                tail.append(line)
+                lines += 1
+                if chunks < max_chunks:
+                    chunk.append(line)
+                    if len(chunk) >= chunk_lines:
+                        output_cb(chunk)
+                        chunk = []
+                        chunks += 1
+
+            process.stdout.close()
+            returncode = process.wait()
+            exited.set()
+            for timer in list(timers):
+                timer.cancel()
+
+            # the lines not streamed yet, as far as they were kept
+            reported = lines - len(chunk) if chunks < max_chunks else chunks * chunk_lines
+            unreported = list(tail)[-(lines - reported):] if lines > reported else []
+            omitted = lines - reported - len(unreported)
+            exit_cb(ShellResult(returncode, bool(timed_out), time.time() - start, unreported, omitted))
+
+        finally:
+            with self._lock:
+                self.running -= 1
+            if self.semaphore is not None:
+                self.semaphore.release()
+            done.set()
+
+    def _start_timer(self, timers, delay, func):
+        timer = Timer(delay, func)
+        timer.daemon = True
+        timers.append(timer)
+        timer.start()
+
+    def _signal(self, process, sig):
+        try:
+            os.killpg(process.pid, sig)
+        except OSError:
+            # already exited
+            pass
+
+
+_runner = None
+_runner_lock = Lock()
+
+def get_shell_runner(max_concurrent=4):
+    """
+    return the shell runner shared by all the executors, creating it on first use
+    """
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = ShellRunner(max_concurrent)
+        return _runner
+#####################################################################################
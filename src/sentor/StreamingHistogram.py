@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+#####################################################################################
+from __future__ import division
+import math
+
+
+class StreamingHistogram(object):
+    """
+    StreamingHistogram estimates quantiles of a stream of positive values with a fixed
+    number of logarithmic buckets, so that memory and updates are O(1) and quantiles
+    have a relative error below growth - 1. If a window is given the histogram covers
+    the values added in the last one to two windows, by rotating two sets of buckets.
+    A quantile queried after every value can be tracked, in which case it is found
+    from the bucket it was in last time rather than by scanning the buckets.
+    Not thread safe.
+    """
+    def __init__(self, min_value=1e-4, max_value=1e3, growth=1.05, window=None):
+        self.min_value = min_value
+        self.growth = growth
+        self.log_growth = math.log(growth)
+        self.window = window
+
+        # plus one bucket for the values below min_value and one for those above max_value
+        self.num_buckets = int(math.ceil(math.log(max_value / min_value) / self.log_growth)) + 2
+
+        # q: [bucket of the quantile, count of the values up to that bucket included], or None
+        self.cursors = {}
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * self.num_buckets
+        self.n = 0
+        self.max = 0.
+        self.previous = [0] * self.num_buckets
+        self.previous_n = 0
+        self.previous_max = 0.
+        self.rotated_at = None
+        self._invalidate()
+
+    def _invalidate(self):
+        for q in self.cursors:
+            self.cursors[q] = None
+
+    def track(self, q):
+        """
+        keep track of the q quantile, so that querying it is O(1) amortised
+        """
+        self.cursors[q] = None
+
+    def bucket(self, value):
+        if value < self.min_value:
+            return 0
+        index = int(math.log(value / self.min_value) / self.log_growth) + 1
+        return min(index, self.num_buckets - 1)
+
+    def rotate(self, now):
+        """
+        start a new window if the current one is over
+        """
+        if self.window is None or now is None:
+            return
+        if self.rotated_at is None:
+            self.rotated_at = now
+            return
+
+        elapsed = now - self.rotated_at
+        if elapsed < self.window:
+            return
+
+        if elapsed < 2 * self.window:
+            self.previous, self.previous_n, self.previous_max = self.counts, self.n, self.max
+            self.counts = [0] * self.num_buckets
+        else:
+            # both windows are over
+            self.previous = [0] * self.num_buckets
+            self.previous_n = 0
+            self.previous_max = 0.
+            self.counts = [0] * self.num_buckets
+        self.n = 0
+        self.max = 0.
+        self.rotated_at = now
+        self._invalidate()
+
+    def add(self, value, now=None):
+        self.rotate(now)
+        index = self.bucket(value)
+        self.counts[index] += 1
+        self.n += 1
+        for cursor in self.cursors.values():
+            if cursor is not None and index <= cursor[0]:
+                cursor[1] += 1
+        if value > self.max:
+            self.max = value
+
+    def count(self, now=None):
+        self.rotate(now)
+        return self.n + self.previous_n
+
+    def get_max(self, now=None):
+        self.rotate(now)
+        return max(self.max, self.previous_max)
+
+    def quantile(self, q, now=None):
+        """
+        return an estimate of the q quantile (0 <= q <= 1), or None if there is no data
+        """
+        total = self.count(now)
+        if not total:
+            return None
+
+        target = q * total
+        if q in self.cursors:
+            i = self._move(q, target)
+        else:
+            cumulative = 0
+            for i in range(self.num_buckets):
+                cumulative += self.counts[i] + self.previous[i]
+                if cumulative >= target and cumulative > 0:
+                    break
+
+        # upper bound of the bucket, which cannot exceed the largest value seen
+        upper = self.min_value * self.growth ** i
+        return min(upper, self.get_max())
+
+    def _move(self, q, target):
+        """
+        move the cursor of a tracked quantile to the first bucket whose cumulative
+        count reaches the target, as a scan from the first bucket would find
+        """
+        counts, previous = self.counts, self.previous
+        cursor = self.cursors[q]
+        if cursor is None:
+            cursor = self.cursors[q] = [0, counts[0] + previous[0]]
+        i, cumulative = cursor
+
+        while i > 0:
+            below = cumulative - counts[i] - previous[i]
+            if below < target or below <= 0:
+                break
+            cumulative = below
+            i -= 1
+
+        last = self.num_buckets - 1
+        while i < last and (cumulative < target or cumulative <= 0):
+            i += 1
+            cumulative += counts[i] + previous[i]
+
+        cursor[0], cursor[1] = i, cumulative
+        return i
+#####################################################################################
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+#####################################################################################
+from threading import Thread, Condition, Lock
+import collections
+import time
+import rospy
+
+
+class ThrottledPublisher(object):
+    """
+    ThrottledPublisher publishes messages to a sink no more often than min_interval,
+    for chatty consumers such as slack bridges. The messages are queued in order
+    and published by a background thread, so the caller never waits. With a
+    min_interval of 0 the messages are published immediately. At most max_pending
+    messages are queued, the other keyword arguments are those of rospy.Publisher.
+    """
+    def __init__(self, topic_name, msg_class, min_interval=0.0, max_pending=100, **kwargs):
+        self.topic_name = topic_name
+        self.min_interval = min_interval
+        self.pub = rospy.Publisher(topic_name, msg_class, **kwargs)
+
+        self._cond = Condition(Lock())
+        self.queue = collections.deque()
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.last_published = 0.
+
+        self.thread = None
+        if min_interval > 0:
+            self.thread = Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def publish(self, msg):
+        if self.thread is None:
+            self.pub.publish(msg)
+            return
+
+        with self._cond:
+            if len(self.queue) >= self.max_pending:
+                # drop the oldest, the latest events matter most
+                self.queue.popleft()
+                self.dropped += 1
+            self.queue.append(msg)
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self.queue:
+                    self._cond.wait()
+
+                wait = self.last_published + self.min_interval - time.time()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+
+                msg = self.queue.popleft()
+                dropped, self.dropped = self.dropped, 0
+                self.last_published = time.time()
+
+            if dropped:
+                rospy.logwarn("Dropped %d messages throttled on %s" % (dropped, self.topic_name))
+            try:
+                self.pub.publish(msg)
+            except rospy.ROSException as e:
+                rospy.logwarn("Unable to publish on %s: %s" % (self.topic_name, e))
+#####################################################################################
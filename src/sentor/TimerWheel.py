@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#####################################################################################
+from threading import Thread, Condition, Lock
+import math
+import rospy
+
+
+class WheelTimer(object):
+    """
+    A one-shot timer handle returned by TimerWheel.call_later
+    """
+    __slots__ = ["wheel", "callback", "expiry_tick", "slot"]
+
+    def __init__(self, wheel, callback):
+        self.wheel = wheel
+        self.callback = callback
+        self.expiry_tick = None
+        self.slot = None
+
+    def cancel(self):
+        self.wheel.cancel(self)
+
+    def shutdown(self):
+        # same interface as rospy.Timer
+        self.wheel.cancel(self)
+
+
+class TimerWheel(Thread):
+    """
+    TimerWheel is a hashed timer wheel running the one-shot timers of all the monitors
+    from a single thread. Arming and cancelling a timer are O(1), timers fire within
+    one tick of their expiry. Time is ROS time, like the rospy.Timers the wheel
+    replaces and the windows of the monitors, so that under simulated time the
+    timers follow the simulation clock, which is polled every tick.
+    """
+    def __init__(self, tick=0.01, n_slots=512):
+        Thread.__init__(self)
+        self.daemon = True
+
+        self.tick = tick
+        self.n_slots = n_slots
+        self.slots = [set() for _ in range(n_slots)]
+        self.n_timers = 0
+
+        self._cond = Condition(Lock())
+        self._t0 = rospy.get_time()
+        self._current_tick = 0
+
+    def call_later(self, delay, callback):
+        """
+        call callback(timer) once after delay seconds
+        @return: WheelTimer that can be cancelled
+        """
+        timer = WheelTimer(self, callback)
+        ticks = max(1, int(math.ceil(delay / self.tick)))
+
+        with self._cond:
+            timer.expiry_tick = self._now_tick() + ticks
+            timer.slot = self.slots[timer.expiry_tick % self.n_slots]
+            timer.slot.add(timer)
+            self.n_timers += 1
+            if self.n_timers == 1:
+                self._cond.notify()
+
+        return timer
+
+    def cancel(self, timer):
+        with self._cond:
+            if timer.slot is not None:
+                timer.slot.discard(timer)
+                timer.slot = None
+                self.n_timers -= 1
+
+    def _now_tick(self):
+        return int((rospy.get_time() - self._t0) / self.tick)
+
+    def run(self):
+        while True:
+            with self._cond:
+                if not self.n_timers:
+                    self._cond.wait()
+                    # skip the ticks elapsed while idle
+                    self._current_tick = self._now_tick()
+                    continue
+
+                now_tick = self._now_tick()
+                if now_tick < self._current_tick:
+                    # ROS time moved backwards, e.g. a bag looping, keep the time left to the timers
+                    self._t0 = rospy.get_time() - self._current_tick * self.tick
+                    continue
+                if now_tick == self._current_tick:
+                    self._cond.wait(min(self.tick, (self._current_tick + 1) * self.tick - (rospy.get_time() - self._t0)))
+                    continue
+
+                expired = []
+                # catch up on every tick elapsed since the last pass, bounded by one turn of the wheel
+                first = max(self._current_tick + 1, now_tick - self.n_slots + 1)
+                for tick in range(first, now_tick + 1):
+                    slot = self.slots[tick % self.n_slots]
+                    for timer in [t for t in slot if t.expiry_tick <= now_tick]:
+                        slot.discard(timer)
+                        timer.slot = None
+                        self.n_timers -= 1
+                        expired.append(timer)
+                self._current_tick = now_tick
+
+            for timer in expired:
+                try:
+                    timer.callback(timer)
+                except Exception as e:
+                    rospy.logerr("Exception in timer callback: %s" % e)
+
+
+_wheel = None
+_wheel_lock = Lock()
+
+def get_timer_wheel():
+    """
+    return the timer wheel shared by all the monitors, starting it on first use
+    """
+    global _wheel
+    with _wheel_lock:
+        if _wheel is None:
+            _wheel = TimerWheel()
+            _wheel.start()
+        return _wheel
+#####################################################################################
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+#####################################################################################
+from threading import Thread, Condition, Lock, Timer
+from sentor.MasterSnapshot import get_master_snapshot
+import time
+import rospy
+
+
+# delays before watching again a topic that was found but could not be attached to,
+# e.g. because its message type cannot be loaded
+RETRY_MIN = 1.0
+RETRY_MAX = 60.0
+
+
+class TopicDiscovery(Thread):
+    """
+    TopicDiscovery watches the master graph for topics that were not published when
+    their monitor or mapper was built, and calls back as soon as they appear.
+    All the watched topics are checked against one batched snapshot per poll. The
+    poll interval backs off while nothing appears, which bounds the latency from a
+    topic appearing to it being monitored by max_interval.
+    """
+    def __init__(self, min_interval=0.5, max_interval=4.0):
+        Thread.__init__(self)
+        self.daemon = True
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+
+        self._cond = Condition(Lock())
+        self.watchers = {}
+
+    def watch(self, topic_name, callback):
+        """
+        call callback(latency) once topic_name is advertised, where latency is an upper
+        bound in seconds on the time from the topic appearing to the callback returning
+        """
+        with self._cond:
+            self.watchers.setdefault(topic_name, []).append(callback)
+            self.interval = self.min_interval
+            self._cond.notify()
+
+    def watch_after(self, delay, topic_name, callback):
+        """
+        watch topic_name after delay seconds (wall time, like the polls)
+        """
+        timer = Timer(delay, self.watch, (topic_name, callback))
+        timer.daemon = True
+        timer.start()
+
+    def run(self):
+        snapshot = get_master_snapshot()
+        last_poll = time.time()
+
+        while True:
+            with self._cond:
+                while not self.watchers:
+                    self._cond.wait()
+                    last_poll = time.time()
+                self._cond.wait(self.interval)
+                watchers = dict(self.watchers)
+
+            poll_time = time.time()
+            new_topics = snapshot.refresh(force=True)
+            if new_topics is None:
+                # master not reachable, keep backing off
+                self._backoff()
+                continue
+
+            found = {}
+            for topic_name, callbacks in watchers.items():
+                real_topic, _ = snapshot.resolve_topic(topic_name)
+                if real_topic is not None:
+                    found[topic_name] = callbacks
+
+            with self._cond:
+                for topic_name in found:
+                    self.watchers.pop(topic_name, None)
+                if found:
+                    self.interval = self.min_interval
+            if not found:
+                self._backoff()
+
+            for topic_name, callbacks in found.items():
+                for callback in callbacks:
+                    try:
+                        callback(time.time() - last_poll)
+                    except Exception as e:
+                        rospy.logerr("Exception while attaching to topic %s: %s" % (topic_name, e))
+
+            last_poll = poll_time
+
+    def _backoff(self):
+        with self._cond:
+            self.interval = min(self.interval * 2, self.max_interval)
+
+
+_discovery = None
+_discovery_lock = Lock()
+
+def get_topic_discovery():
+    """
+    return the topic discovery service shared by all the monitors, starting it on first use
+    """
+    global _discovery
+    with _discovery_lock:
+        if _discovery is None:
+            _discovery = TopicDiscovery()
+            _discovery.start()
+        return _discovery
+#####################################################################################
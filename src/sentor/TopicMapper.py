@@ -8,10 +8,13 @@ Created on Tue Feb 25 08:55:41 2020
 from __future__ import division
 from threading import Thread, Event
 from cv2 import imread
+from sentor.TopicSubscriber import get_subscriber
+from sentor.MasterSnapshot import get_master_snapshot
+from sentor.TopicDiscovery import get_topic_discovery, RETRY_MIN, RETRY_MAX
 
-import rospy, rostopic, tf
+import rospy, tf
 import numpy as np, math
-import yaml, os, subprocess
+import yaml, os
 
 
 class bcolors:
@@ -65,8 +68,36 @@ class TopicMapper(Thread):
         self._stop_event = Event()
 
         self.tf_listener = tf.TransformListener()          
+
+        # whether the topic was found but its type could not be determined
+        self.type_error = False
+        self.type_error_reported = False
+        self.attach_retry_delay = RETRY_MIN
         
         self.is_instantiated = self.instantiate()
+
+
+    def run(self):
+        if not self.is_instantiated:
+            self.watch()
+
+
+    def topic_discovered(self, latency):
+        self.is_instantiated = self.instantiate()
+        if self.is_instantiated:
+            rospy.loginfo("Topic {} is now published, mapping started within {:.2f} seconds".format(self.topic_name, latency))
+        else:
+            self.watch()
+
+
+    def watch(self):
+        # attach the mapper as soon as the topic appears, or with a backoff if it is
+        # published but cannot be attached to
+        if self.type_error:
+            get_topic_discovery().watch_after(self.attach_retry_delay, self.topic_name, self.topic_discovered)
+            self.attach_retry_delay = min(self.attach_retry_delay * 2, RETRY_MAX)
+        else:
+            get_topic_discovery().watch(self.topic_name, self.topic_discovered)
         
         
     def set_limits(self):
@@ -156,11 +187,14 @@ class TopicMapper(Thread):
     def instantiate(self):
         
         try:
-            msg_class, real_topic, _ = rostopic.get_topic_class(self.topic_name, blocking=False)
-            topic_type, _, _ = rostopic.get_topic_type(self.topic_name, blocking=False)
-        except rostopic.ROSTopicException:
-            rospy.logerr("Topic {} type cannot be determined, or ROS master cannot be contacted".format(self.topic_name))
+            msg_class, real_topic = get_master_snapshot().get_topic_class(self.topic_name)
+        except Exception:
+            self.type_error = True
+            if not self.type_error_reported:
+                rospy.logerr("Topic {} type cannot be determined, or ROS master cannot be contacted, retrying in the background".format(self.topic_name))
+                self.type_error_reported = True
             return False
+        self.type_error = False
 
         if real_topic is None:
             rospy.logerr("Topic {} is not published".format(self.topic_name))
@@ -172,16 +206,8 @@ class TopicMapper(Thread):
         if "rate" in self.config:
             rate = self.config["rate"]
             
-        if rate > 0:
-            COMMAND_BASE = ["rosrun", "topic_tools", "throttle"]
-            subscribed_topic = "/sentor/mapping/" + str(self.thread_num) + real_topic
-            
-            command = COMMAND_BASE + ["messages", real_topic, str(rate), subscribed_topic]
-            subprocess.Popen(command, stdout=open(os.devnull, "wb"))
-        else:
-            subscribed_topic = real_topic
-            
-        rospy.Subscriber(subscribed_topic, msg_class, self.topic_cb)
+        subscriber = get_subscriber(real_topic, msg_class, rate)
+        subscriber.register_consumer("{}: mapper".format(self.thread_num), self.topic_cb)
             
         return True
             
@@ -4,19 +4,23 @@
 @author: Adam Binch (abinch@sagarobotics.com)
 """
 #####################################################################################
-from sentor.ROSTopicHz import ROSTopicHz
+from sentor.ROSTopicLatency import ROSTopicLatency
 from sentor.ROSTopicFilter import ROSTopicFilter
 from sentor.ROSTopicPub import ROSTopicPub
+from sentor.ROSTopicRate import ROSTopicRate, RATE_CONDITIONS
 from sentor.Executor import Executor
-
-from threading import Thread, Event, Lock
-import socket
-import rostopic
-import rosgraph
+from sentor.TopicSubscriber import get_subscriber
+from sentor.PartialDecoder import PartialDecoder, get_field_paths
+from sentor.ExpressionCompiler import ExpressionCompiler
+from sentor.DeadlineScheduler import get_scheduler
+from sentor.TimerWheel import get_timer_wheel
+from sentor.MasterSnapshot import get_master_snapshot
+from sentor.TopicDiscovery import get_topic_discovery, RETRY_MIN, RETRY_MAX
+from sentor.WorkerPool import get_worker_pool, PRIORITY_SAFETY_CRITICAL, PRIORITY_DEFAULT
+
+from threading import Event, Lock
 import rospy
 import time
-import subprocess
-import os
 
 class bcolors:
     HEADER = '\033[95m'
@@ -31,12 +35,12 @@ class bcolors:
 
 
 ##########################################################################################
-class TopicMonitor(Thread):
+class TopicMonitor(object):
 
 
     def __init__(self, topic_name, rate, signal_when_config, signal_lambdas_config, processes, 
-                 timeout, default_notifications, event_callback, thread_num):
-        Thread.__init__(self)
+                 timeout, default_notifications, event_callback, thread_num, partial_deserialization=False,
+                 execute_queue_size=10, execute_overflow="coalesce", execute_min_interval=0.0):
 
         self.topic_name = topic_name
         self.rate = rate
@@ -50,91 +54,113 @@ class TopicMonitor(Thread):
         self.default_notifications = default_notifications
         self._event_callback = event_callback
         self.thread_num = thread_num
+        self.partial_deserialization = partial_deserialization
         
         self.nodes = []
+
+        # whether the topic was found but its type could not be determined
+        self.type_error = False
+        self.type_error_reported = False
+        self.attach_retry_delay = RETRY_MIN
+        self.lambda_monitor_list = []
+        self.lambda_monitors = {}
         self.sat_crit_expressions = []
         self.sat_expressions_timer = {}
         self.sat_expr_repeat_timer = {}
         self.crit_conditions = {}
+        self.condition_callbacks = []
         
         self.process_signal_config()
         
         self._stop_event = Event()
         self._killed_event = Event()
         self._lock = Lock()
+
+        # 'not published' is detected by a deadline reset on every message arrival
+        scheduler = get_scheduler()
+        self.not_published_deadline = scheduler.deadline(self.signal_when_timeout, self.not_published_cb)
+        self.repeat_deadline = scheduler.deadline(self.signal_when_timeout, self.not_published_repeat_cb, 
+                                                  period=self.signal_when_timeout)
+
+        # satisfaction and repeat timers of the lambda expressions
+        self.timer_wheel = get_timer_wheel()
         
         self.pub_monitor = None
-        self.hz_monitor = None
+        self.liveness_monitored = False
+        self.bw_monitor = None
+        self.latency_monitor = None
+        self.rate_monitor = None
         self.is_topic_published = True 
         self.is_instantiated = False
         self.is_instantiated = self._instantiate_monitors()
         
-        self.signal_when_is_safe = True
-        self.lambdas_are_safe = True
-        self.thread_is_safe = True
-        
         if processes:
-            self.executor = Executor(processes, self.event_callback)
+            # the executor is named after its queue, so that its metrics match the queue's
+            self.queue_name = "{} ({})".format(self.topic_name, self.thread_num)
+            self.executor = Executor(processes, self.event_callback, self.queue_name, execute_min_interval)
+
+            # the process sequences of this monitor run in order on the shared worker pool
+            self.worker_pool = get_worker_pool()
+            try:
+                self.worker_pool.add_queue(self.queue_name, execute_queue_size, execute_overflow)
+            except ValueError as e:
+                self.event_callback("Topic %s: %s" % (self.topic_name, e), "warn")
+                self.worker_pool.add_queue(self.queue_name, execute_queue_size)
 
 
     def _instantiate_monitors(self):
         if self.is_instantiated: return True
 
+        snapshot = get_master_snapshot()
         try:
-            msg_class, real_topic, _ = rostopic.get_topic_class(self.topic_name, blocking=False)
-            topic_type, _, _ = rostopic.get_topic_type(self.topic_name, blocking=False)
-        except rostopic.ROSTopicException as e:
-            self.event_callback("Topic %s type cannot be determined, or ROS master cannot be contacted" % self.topic_name, "warn")
+            msg_class, real_topic = snapshot.get_topic_class(self.topic_name)
+        except Exception as e:
+            self.type_error = True
+            if not self.type_error_reported:
+                self.event_callback("Topic %s type cannot be determined, or ROS master cannot be contacted, retrying in the background" % self.topic_name, "warn")
+                self.type_error_reported = True
             return False
+        self.type_error = False
 
         if real_topic is None:
             self.event_callback("Topic %s is not published" % self.topic_name, "warn")
+            self.is_topic_published = False
             if self.signal_when.lower() == 'not published' and self.safety_critical:
-                self.signal_when_is_safe = False
+                self.set_condition_safe(self.signal_when, False)
             return False
         
-        # if rate > 0 set in config then throttle topic at that rate
-        if self.rate > 0:
-            COMMAND_BASE = ["rosrun", "topic_tools", "throttle"]
-            subscribed_topic = "/sentor/monitoring/" + str(self.thread_num) + real_topic
-            
-            command = COMMAND_BASE + ["messages", real_topic, str(self.rate), subscribed_topic]
-            subprocess.Popen(command, stdout=open(os.devnull, "wb"))
-        else:
-            subscribed_topic = real_topic
-
         # find out topic publishing nodes
-        master = rosgraph.Master(rospy.get_name())
-        try:
-            pubs, _ = rostopic.get_topic_list(master=master)
-            # filter based on topic
-            pubs = [x for x in pubs if x[0] == real_topic]
-            nodes = []
-            for _, _, _nodes in pubs:
-                nodes += _nodes
-            self.nodes = nodes
-        except socket.error:
-            self.event_callback("Could not retrieve nodes for topic %s" % self.topic_name, "warn")
-
-        # Do we need a hz monitor?
-        hz_monitor_required = False
+        self.nodes = snapshot.get_publishers(real_topic)
+
+        # Do we need to know whether the topic is still published?
+        liveness_required = False
         if self.signal_when.lower() == 'not published':
-            hz_monitor_required = True
+            liveness_required = True
         for signal_lambda in self.signal_lambdas_config:
              if "when_published" in signal_lambda:
                  if signal_lambda["when_published"]:
-                     hz_monitor_required = True
+                     liveness_required = True
         
-        if hz_monitor_required:
-            self.hz_monitor = self._instantiate_hz_monitor(subscribed_topic, self.topic_name, msg_class)
+        # a single subscription is shared by all the monitors of this topic
+        # if rate > 0 set in config then the subscription is throttled at that rate
+        subscriber = get_subscriber(real_topic, msg_class, self.rate)
+
+        # bandwidth and message sizes are always monitored, from the serialized messages,
+        # once for all the monitors of the subscription
+        self.bw_monitor = subscriber.get_bw_monitor(self.signal_when_window)
+
+        if liveness_required:
+            # the topic is not published anymore once no message arrives before the deadline
+            self.liveness_monitored = True
+            subscriber.register_consumer("{}: alive".format(self.thread_num), self.message_received, raw=True)
 
         if self.signal_when.lower() == 'published':
             print "Signaling 'published' for "+ bcolors.OKBLUE + self.topic_name + bcolors.ENDC +" initialized"
-            self.pub_monitor = self._instantiate_pub_monitor(subscribed_topic, self.topic_name, msg_class)
+            self.pub_monitor = self._instantiate_pub_monitor(subscriber, self.topic_name)
             self.pub_monitor.register_published_cb(self.published_cb)
             
             if self.safety_critical:
-                self.signal_when_is_safe = False
+                self.set_condition_safe(self.signal_when, False)
 
         elif self.signal_when.lower() == 'not published':
             print "Signaling 'not published' for "+ bcolors.BOLD + str(self.signal_when_timeout) + " seconds" + bcolors.ENDC +" for " + bcolors.OKBLUE + self.topic_name + bcolors.ENDC +" initialized"
@@ -142,7 +168,6 @@ class TopicMonitor(Thread):
         if len(self.signal_lambdas_config):
             print "Signaling expressions for "+ bcolors.OKBLUE + self.topic_name + bcolors.ENDC + ":"
             
-            self.lambda_monitor_list = []
             for signal_lambda in self.signal_lambdas_config:
                 
                 lambda_fn_str = signal_lambda["expression"]
@@ -150,15 +175,28 @@ class TopicMonitor(Thread):
                 
                 if lambda_fn_str != "":
                     print "\t" + bcolors.OKGREEN + lambda_fn_str + bcolors.ENDC + " ("+ bcolors.BOLD+"timeout: %s seconds" %  lambda_config["timeout"] + bcolors.ENDC +")"
-                    lambda_monitor = self._instantiate_lambda_monitor(subscribed_topic, msg_class, lambda_fn_str, lambda_config)
+                    lambda_monitor = self._instantiate_lambda_monitor(lambda_fn_str, lambda_config)
 
                     # register cb that notifies when the lambda function is True
                     lambda_monitor.register_satisfied_cb(self.lambda_satisfied_cb)
                     lambda_monitor.register_unsatisfied_cb(self.lambda_unsatisfied_cb)
 
                     self.lambda_monitor_list.append(lambda_monitor)
+                    self.lambda_monitors[lambda_fn_str] = lambda_monitor
             print ""
 
+            self._register_lambda_monitors(subscriber, msg_class)
+
+        if self.signal_when.lower() == 'latency above':
+            if getattr(msg_class, "_has_header", False):
+                self.latency_monitor = self._instantiate_latency_monitor(subscriber, self.topic_name)
+            else:
+                self.event_callback("Condition '%s' on topic %s requires messages with a header" % (self.signal_when, self.topic_name), "warn")
+
+        if self.signal_when.lower() in RATE_CONDITIONS and (self.signal_when.lower() != 'latency above' or self.latency_monitor is not None):
+            print "Signaling '" + self.rate_expr + "' over " + bcolors.BOLD + str(self.signal_when_window) + " seconds" + bcolors.ENDC +" for " + bcolors.OKBLUE + self.topic_name + bcolors.ENDC +" initialized"
+            self.rate_monitor = self._instantiate_rate_monitor(subscriber)
+
         self.is_instantiated = True
 
         return True
@@ -177,6 +215,10 @@ class TopicMonitor(Thread):
         self.process_indices = None
         self.repeat_exec = False
         self.tags = []
+        self.signal_when_value = None
+        self.signal_when_window = 1.0
+        self.signal_when_quantile = 0.5
+        self.rate_expr = ""
         
         if type(self.signal_when_config) is str:
             self.signal_when = self.signal_when_config
@@ -196,18 +238,62 @@ class TopicMonitor(Thread):
                 self.repeat_exec = self.signal_when_config["repeat_exec"]
             if "tags" in self.signal_when_config:
                 self.tags = self.signal_when_config["tags"]
+            if "value" in self.signal_when_config:
+                self.signal_when_value = self.signal_when_config["value"]
+            if "window" in self.signal_when_config:
+                self.signal_when_window = self.signal_when_config["window"]
+            if "quantile" in self.signal_when_config:
+                self.signal_when_quantile = self.signal_when_config["quantile"]
             
         if self.signal_when_timeout <= 0:
             self.signal_when_timeout = 0.1
+
+        if self.signal_when.lower() in RATE_CONDITIONS:
+            if self.signal_when_value is None:
+                self.event_callback("Condition '%s' on topic %s requires a value" % (self.signal_when, self.topic_name), "warn")
+                self.signal_when = ""
+            else:
+                # rate conditions are handled like expressions, see _instantiate_rate_monitor
+                _, _, unit = RATE_CONDITIONS[self.signal_when.lower()]
+                self.rate_expr = "%s %s %s" % (self.signal_when.lower(), self.signal_when_value, unit)
+                if self.signal_when.lower() == 'latency above':
+                    self.rate_expr = "p%g %s" % (self.signal_when_quantile * 100, self.rate_expr)
+                return
         
         # for publishing list of safety critical conditions
         if self.safety_critical:
-            d = {}
-            d["safe"] = True
-            d["tags"] = self.tags
-            self.crit_conditions[self.signal_when] = d
+            self.add_condition(self.signal_when, self.tags)
             
         
+    def add_condition(self, expr, tags):
+        d = {}
+        d["safe"] = True
+        d["tags"] = tags
+        self.crit_conditions[expr] = d
+
+        for func in self.condition_callbacks:
+            func(self, expr, True)
+
+
+    def set_condition_safe(self, expr, safe):
+        # the listeners are notified on transitions only
+        condition = self.crit_conditions[expr]
+        if condition["safe"] == safe:
+            return
+        condition["safe"] = safe
+
+        for func in self.condition_callbacks:
+            func(self, expr, safe)
+
+
+    def register_condition_cb(self, func):
+        """
+        func(monitor, expr, safe) is called when a safety critical condition is added
+        or changes between safe and unsafe
+        """
+        self.condition_callbacks.append(func)
+
+
     def process_lambda_config(self, signal_lambda):
 
         lambda_config = {}
@@ -248,147 +334,247 @@ class TopicMonitor(Thread):
         
         # for publishing list of safety critical conditions
         if lambda_config["safety_critical"]:
-            d = {}
-            d["safe"] = True
-            d["tags"] = lambda_config["tags"]
-            self.crit_conditions[lambda_config["expr"]] = d
+            self.add_condition(lambda_config["expr"], lambda_config["tags"])
             
         return lambda_config
         
 
-    def _instantiate_hz_monitor(self, subscribed_topic, topic_name, msg_class):
-        hz = ROSTopicHz(topic_name, 1000)
+    def _instantiate_latency_monitor(self, subscriber, topic_name):
+        latency = ROSTopicLatency(topic_name, self.signal_when_window)
 
-        rospy.Subscriber(subscribed_topic, msg_class, hz.callback_hz)
+        subscriber.register_consumer("{}: latency".format(self.thread_num), latency.callback_latency, unthrottled=True)
 
-        return hz
+        return latency
         
 
-    def _instantiate_pub_monitor(self, subscribed_topic, topic_name, msg_class):
+    def _instantiate_pub_monitor(self, subscriber, topic_name):
         pub = ROSTopicPub(topic_name)
 
-        rospy.Subscriber(subscribed_topic, msg_class, pub.callback_pub)
+        subscriber.register_consumer("{}: pub".format(self.thread_num), pub.callback_pub)
 
         return pub
         
 
-    def _instantiate_lambda_monitor(self, subscribed_topic, msg_class, lambda_fn_str, lambda_config):
+    def _instantiate_lambda_monitor(self, lambda_fn_str, lambda_config):
         filter = ROSTopicFilter(self.topic_name, lambda_fn_str, lambda_config)
 
-        rospy.Subscriber(subscribed_topic, msg_class, filter.callback_filter)
-
         return filter
+
+
+    def _instantiate_rate_monitor(self, subscriber):
+        signal_lambda = {"expression": self.rate_expr,
+                         "timeout": self.signal_when_timeout,
+                         "safety_critical": self.safety_critical,
+                         "default_notifications": self.signal_when_def_nots,
+                         "process_indices": self.process_indices,
+                         "repeat_exec": self.repeat_exec,
+                         "tags": self.tags}
+        lambda_config = self.process_lambda_config(signal_lambda)
+
+        rate = ROSTopicRate(self.topic_name, self.signal_when.lower(), self.signal_when_value, 
+                            self.signal_when_window, lambda_config, self.bw_monitor, 
+                            self.latency_monitor, self.signal_when_quantile)
+        rate.register_satisfied_cb(self.lambda_satisfied_cb)
+        rate.register_unsatisfied_cb(self.lambda_unsatisfied_cb)
+
+        # the statistics are those of the topic, whatever the throttling of the subscription
+        subscriber.register_consumer("{}: {}".format(self.thread_num, self.rate_expr), rate.callback_rate, unthrottled=True)
+
+        self.lambda_monitor_list.append(rate)
+        self.lambda_monitors[self.rate_expr] = rate
+
+        return rate
+
+
+    def _register_lambda_monitors(self, subscriber, msg_class):
+        # expressions read from a file are evaluated on their own
+        fusable = [f for f in self.lambda_monitor_list if f.config["file"] is None and f.lambda_fn is not None]
+        others = [f for f in self.lambda_monitor_list if f not in fusable]
+
+        if fusable:
+            # the other expressions of the topic are evaluated at once, sharing common sub-expressions
+            compiler = ExpressionCompiler([f.lambda_fn_str for f in fusable])
+            fused = [fusable[i] for i in compiler.fused_indices]
+            others += [f for f in fusable if f not in fused]
+
+            if fused:
+                self._register_fused_monitors(subscriber, msg_class, compiler, fused)
+
+        for filter in others:
+            self._register_lambda_monitor(subscriber, msg_class, filter)
+
+
+    def _register_lambda_monitor(self, subscriber, msg_class, filter):
+        name = "{}: {}".format(self.thread_num, filter.lambda_fn_str)
+
+        decoder = None
+        if self.partial_deserialization and filter.config["file"] is None:
+            decoder = self._instantiate_partial_decoder(msg_class, [filter.lambda_fn_str])
+
+        if decoder is not None:
+            subscriber.register_consumer(name, lambda raw_msg: filter.callback_filter(decoder.deserialize(raw_msg._buff)), raw=True)
+        else:
+            subscriber.register_consumer(name, filter.callback_filter)
+
+
+    def _register_fused_monitors(self, subscriber, msg_class, compiler, filters):
+        name = "{}: expressions".format(self.thread_num)
+
+        def callback(msg):
+            for filter, result in zip(filters, compiler.evaluate(msg)):
+                filter.callback_result(result, msg)
+
+        decoder = None
+        if self.partial_deserialization:
+            decoder = self._instantiate_partial_decoder(msg_class, [f.lambda_fn_str for f in filters])
+
+        if decoder is not None:
+            subscriber.register_consumer(name, lambda raw_msg: callback(decoder.deserialize(raw_msg._buff)), raw=True)
+        else:
+            subscriber.register_consumer(name, callback)
         
 
-    def run(self):
+    def _instantiate_partial_decoder(self, msg_class, lambda_fn_strs):
+        # decode only the fields read by the expressions, else fall back to full deserialization
+        paths = set()
+        for lambda_fn_str in lambda_fn_strs:
+            expr_paths = get_field_paths(lambda_fn_str)
+            if expr_paths is None:
+                self.event_callback("Expression '%s' cannot be analysed for partial deserialization" % lambda_fn_str, "warn")
+                return None
+            paths.update(expr_paths)
+        
+        try:
+            return PartialDecoder(msg_class, sorted(paths))
+        except Exception as e:
+            self.event_callback("Unable to partially deserialize %s on topic %s: %s" % (lambda_fn_strs, self.topic_name, e), "warn")
+            return None
+        
+
+    def start(self):
         # if the topic was not published initially then no monitor is running
         # but, maybe now it is published
         if not self.is_instantiated:
-            if not self._instantiate_monitors():
-                return
-            else:
-                self.is_instantiated = True
-                
-        def cb(_):
-            if self.signal_when.lower() == 'not published':
-                if self.safety_critical:
-                    self.signal_when_is_safe = False
-                    self.crit_conditions[self.signal_when]["safe"] = False
-                if self.signal_when_def_nots and self.safety_critical:
-                    self.event_callback("SAFETY CRITICAL: Topic %s is not published anymore" % self.topic_name, "error")
-                elif self.signal_when_def_nots:
-                    self.event_callback("Topic %s is not published anymore" % self.topic_name, "warn")
-                if not self.repeat_exec:
-                    self.execute(process_indices=self.process_indices)
-
-        def repeat_cb(_):
-            if self.signal_when.lower() == 'not published':
-                self.execute(process_indices=self.process_indices)
-
-        timer = None
-        timer_repeat = None
-        while not self._killed_event.isSet():
-            while not self._stop_event.isSet():
-                
-                self.thread_is_safe = self.signal_when_is_safe and self.lambdas_are_safe
-                
-                # check it is still published (None if not)
-                if self.hz_monitor is not None:
-                    rate = self.hz_monitor.get_hz()
-                    
-                    if rate is None and self.is_topic_published:
-                        self.is_topic_published = False
-    
-                        timer = rospy.Timer(rospy.Duration.from_sec(self.signal_when_timeout), cb, oneshot=True)
-                        
-                        if self.repeat_exec:
-                            timer_repeat = rospy.Timer(rospy.Duration.from_sec(self.signal_when_timeout), repeat_cb, oneshot=False)
-    
-                    if rate is not None:
-                        self.is_topic_published = True
-                        
-                        if self.safety_critical:
-                            self.signal_when_is_safe = True
-                            self.crit_conditions[self.signal_when]["safe"] = True
-    
-                        if timer is not None:
-                            timer.shutdown()
-                            timer = None
-                        
-                        if self.repeat_exec:
-                            if timer_repeat is not None:
-                                timer_repeat.shutdown()
-                                timer_repeat = None
+            self.is_instantiated = self._instantiate_monitors()
+
+        if self.is_instantiated:
+            self._arm()
+        else:
+            self._watch()
+
+
+    def topic_discovered(self, latency):
+        self.is_instantiated = self._instantiate_monitors()
+        if self.is_instantiated:
+            self.event_callback("Topic %s is now published, monitoring started within %.2f seconds" % (self.topic_name, latency), "info")
+            self._arm()
+        else:
+            self._watch()
+
+
+    def _watch(self):
+        # attach the monitors as soon as the topic appears, or with a backoff if it is
+        # published but cannot be attached to
+        if self.type_error:
+            get_topic_discovery().watch_after(self.attach_retry_delay, self.topic_name, self.topic_discovered)
+            self.attach_retry_delay = min(self.attach_retry_delay * 2, RETRY_MAX)
+        else:
+            get_topic_discovery().watch(self.topic_name, self.topic_discovered)
+
+
+    def _arm(self):
+        # the topic is considered not published if no message arrives before the deadline
+        if self.liveness_monitored and not self._killed_event.isSet():
+            self.not_published_deadline.reset()
+
+        if self.rate_monitor is not None and not self._killed_event.isSet():
+            self.rate_monitor.start()
+
+
+    def message_received(self, msg):
+        self.not_published_deadline.reset()
+
+        if not self.is_topic_published:
+            self._lock.acquire()
+            self.is_topic_published = True
+            self.repeat_deadline.cancel()
+            self._lock.release()
+
+            if self.signal_when.lower() == 'not published' and self.safety_critical:
+                self.set_condition_safe(self.signal_when, True)
+
+
+    def not_published_cb(self, _):
+        self.is_topic_published = False
+
+        if self._stop_event.isSet() or self.signal_when.lower() != 'not published':
+            return
+
+        if self.safety_critical:
+            self.set_condition_safe(self.signal_when, False)
+        if self.signal_when_def_nots and self.safety_critical:
+            self.event_callback("SAFETY CRITICAL: Topic %s is not published anymore" % self.topic_name, "error")
+        elif self.signal_when_def_nots:
+            self.event_callback("Topic %s is not published anymore" % self.topic_name, "warn")
+
+        self.execute_async(process_indices=self.process_indices, safety_critical=self.safety_critical, expr=self.signal_when)
+        if self.repeat_exec:
+            self.repeat_deadline.reset()
+
+
+    def not_published_repeat_cb(self, _):
+        if not self._stop_event.isSet() and not self.is_topic_published:
+            self.execute_async(process_indices=self.process_indices, safety_critical=self.safety_critical, expr=self.signal_when)
+        else:
+            self.repeat_deadline.cancel()
 
-                time.sleep(0.3)
-            time.sleep(1)
-            
 
     def lambda_satisfied_cb(self, expr, msg, config):
         
-        def ProcessLambda(timer_dict):
-            process_lambda = True
-            if config["when_published"] and not self.is_topic_published:
-                process_lambda = False
-                timer_dict = self.kill_timer(timer_dict, config["expr"]) 
-            return process_lambda, timer_dict
+        def ProcessLambda():
+            # gated expressions are only processed while the topic is published
+            return not config["when_published"] or self.is_topic_published
             
         if not self._stop_event.isSet():    
-            if not expr in self.sat_expressions_timer:
                 
-                def cb(_):
-                    process_lambda, self.sat_expressions_timer = ProcessLambda(self.sat_expressions_timer)
-                    if process_lambda:
-                        if config["safety_critical"]:
-                            self.lambdas_are_safe = False
-                            self.sat_crit_expressions.append(config["expr"])
-                            self.crit_conditions[config["expr"]]["safe"] = False
-                        
-                        if config["default_notifications"]:
-                            if config["safety_critical"]:
-                                self.event_callback("SAFETY CRITICAL: Expression '%s' for %s seconds on topic %s satisfied" % (expr, config["timeout"], self.topic_name), "error", msg)
-                            else:
-                                self.event_callback("Expression '%s' for %s seconds on topic %s satisfied" % (expr, config["timeout"], self.topic_name), "warn", msg)
-                        
-                        if not config["repeat_exec"]:
-                            self.execute(msg, config["process_indices"])
+            def cb(timer):
+                with self._lock:
+                    # the timer may have been killed while firing, once the expression was unsatisfied
+                    if self.sat_expressions_timer.get(expr) is not timer:
+                        return
+                    process = ProcessLambda()
+                    if process and config["safety_critical"]:
+                        self.sat_crit_expressions.append(config["expr"])
+                        self.set_condition_safe(config["expr"], False)
+
+                if not process:
+                    # the filter only notifies transitions, so retry while the expression stays satisfied
+                    self.rearm_timer(self.sat_expressions_timer, expr, config["timeout"], cb)
+                    return
+                
+                if config["default_notifications"]:
+                    if config["safety_critical"]:
+                        self.event_callback("SAFETY CRITICAL: Expression '%s' for %s seconds on topic %s satisfied" % (expr, config["timeout"], self.topic_name), "error", msg)
+                    else:
+                        self.event_callback("Expression '%s' for %s seconds on topic %s satisfied" % (expr, config["timeout"], self.topic_name), "warn", msg)
+                
+                if not config["repeat_exec"]:
+                    self.execute_async(msg, config["process_indices"], config["safety_critical"], expr)
                 
-                self._lock.acquire()
-                self.sat_expressions_timer.update({expr: rospy.Timer(rospy.Duration.from_sec(config["timeout"]), cb, oneshot=True)})
-                self._lock.release()
+            self.arm_timer(self.sat_expressions_timer, expr, config["timeout"], cb)
             
             if config["repeat_exec"]:
-                if not expr in self.sat_expr_repeat_timer:
                     
-                    def repeat_cb(_):
-                        process_lambda, self.sat_expr_repeat_timer = ProcessLambda(self.sat_expr_repeat_timer)
-                        if process_lambda:     
-                            self.execute(msg, config["process_indices"])
-                            self.sat_expr_repeat_timer = self.kill_timer(self.sat_expr_repeat_timer, config["expr"]) 
-                            
-                    self._lock.acquire()
-                    self.sat_expr_repeat_timer.update({expr: rospy.Timer(rospy.Duration.from_sec(config["timeout"]), repeat_cb, oneshot=True)})
-                    self._lock.release()  
+                def repeat_cb(timer):
+                    with self._lock:
+                        if self.sat_expr_repeat_timer.get(expr) is not timer:
+                            return
+                    if ProcessLambda():     
+                        self.execute_async(self.lambda_monitors[expr].msg, config["process_indices"], config["safety_critical"], expr)
+                    # repeat every timeout while the expression stays satisfied
+                    self.rearm_timer(self.sat_expr_repeat_timer, expr, config["timeout"], repeat_cb)
+                        
+                self.arm_timer(self.sat_expr_repeat_timer, expr, config["timeout"], repeat_cb)
                     
 
     def lambda_unsatisfied_cb(self, expr):
@@ -401,17 +587,13 @@ class TopicMonitor(Thread):
                 
             if expr in self.sat_crit_expressions:
                 self.sat_crit_expressions.remove(expr)
-                self.crit_conditions[expr]["safe"] = True
-                
-            if not self.sat_crit_expressions:
-                self.lambdas_are_safe = True
+                self.set_condition_safe(expr, True)
 
 
     def published_cb(self, msg):
         if not self._stop_event.isSet():
             if self.safety_critical:
-                self.signal_when_is_safe = False
-                self.crit_conditions[self.signal_when]["safe"] = False
+                self.set_condition_safe(self.signal_when, False)
             if self.default_notifications and self.safety_critical:
                 self.event_callback("SAFETY CRITICAL: Topic %s is published " % (self.topic_name), "error")
             elif self.default_notifications:
@@ -419,18 +601,43 @@ class TopicMonitor(Thread):
             #self.execute(msg, self.process_indices)
                 
                 
+    def arm_timer(self, timer_dict, expr, timeout, cb):
+        self._lock.acquire()
+        if not expr in timer_dict:
+            timer_dict[expr] = self.timer_wheel.call_later(timeout, cb)
+        self._lock.release()
+        
+        
+    def rearm_timer(self, timer_dict, expr, timeout, cb):
+        # unless the timer was killed meanwhile
+        self._lock.acquire()
+        if expr in timer_dict:
+            timer_dict[expr] = self.timer_wheel.call_later(timeout, cb)
+        self._lock.release()
+        
+        
     def kill_timer(self, timer_dict, expr):
         self._lock.acquire()
-        timer_dict[expr].shutdown()
-        timer_dict.pop(expr)
+        timer = timer_dict.pop(expr, None)
+        if timer is not None:
+            timer.cancel()
         self._lock.release()
         return timer_dict
             
             
-    def execute(self, msg=None, process_indices=None):
+    def execute(self, msg=None, process_indices=None, submitted=None):
         if self.processes:
-            rospy.sleep(0.1) # needed when using slackeros
-            self.executor.execute(msg, process_indices)
+            self.executor.execute(msg, process_indices, submitted)
+
+
+    def execute_async(self, msg=None, process_indices=None, safety_critical=False, expr=None):
+        # keep the shared scheduler thread free while processes run, safety critical
+        # sequences are run ahead of the others
+        if self.processes:
+            priority = PRIORITY_SAFETY_CRITICAL if safety_critical else PRIORITY_DEFAULT
+            # only the pending executions triggered by the same condition are coalesced
+            key = (expr, tuple(process_indices) if process_indices is not None else "all")
+            self.worker_pool.submit(self.queue_name, self.execute, (msg, process_indices, time.time()), priority, key)
             
             
     def stop_monitor(self):
@@ -439,9 +646,25 @@ class TopicMonitor(Thread):
 
     def start_monitor(self):
         self._stop_event.clear()
+
+        # the filters only notify transitions, catch up with those missed while not monitoring
+        if self.is_instantiated:
+            for lambda_monitor in self.lambda_monitor_list:
+                if lambda_monitor.notified_satisfied:
+                    self.lambda_satisfied_cb(lambda_monitor.lambda_fn_str, lambda_monitor.msg, lambda_monitor.config)
+                else:
+                    self.lambda_unsatisfied_cb(lambda_monitor.lambda_fn_str)
+
+        # report again a topic that stopped being published while not monitoring
+        if not self.is_topic_published:
+            self.not_published_deadline.reset()
         
 
     def kill_monitor(self):
         self.stop_monitor()
         self._killed_event.set()
+        self.not_published_deadline.cancel()
+        self.repeat_deadline.cancel()
+        if self.rate_monitor is not None:
+            self.rate_monitor.stop()
 ##########################################################################################
\ No newline at end of file
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+#####################################################################################
+import rospy
+from sentor.ROSTopicBw import ROSTopicBw
+from sentor.msg import SubscriberStats
+from sentor.srv import GetSubscriberStats, GetSubscriberStatsResponse
+from threading import Lock
+
+
+class TopicSubscriber(object):
+    """
+    TopicSubscriber holds a single subscription to a topic and hands every message
+    it receives to all of the registered consumers (hz, pub and filter monitors).
+
+    The topic is subscribed with rospy.AnyMsg so that messages above the throttling
+    rate are dropped before they are deserialized, and so that consumers which only
+    need the raw buffer never pay for deserialization. Consumers measuring the topic
+    (bandwidth, latency, rate) are handed the messages before the throttling, and
+    the bandwidth stats are kept once per window for all of them.
+    """
+    def __init__(self, topic_name, msg_class, rate=0):
+        self.topic_name = topic_name
+        self.msg_class = msg_class
+        self.rate = rate
+
+        # same semantics as 'rosrun topic_tools throttle messages'
+        self.period = 1.0 / rate if rate > 0 else 0.0
+        self.last_time = None
+        self.throttled = 0
+
+        self._lock = Lock()
+        self.consumers = []
+        self.raw_consumers = []
+        self.unthrottled_consumers = []
+        self.dropped = {}
+        self.bw_monitors = {}
+
+        self.sub = rospy.Subscriber(topic_name, rospy.AnyMsg, self.callback)
+
+    def register_consumer(self, name, func, raw=False, unthrottled=False):
+        """
+        register a callback that receives every message on the topic
+        @param name: name of the consumer, used to count dropped messages
+        @param func: callable taking the message instance
+        @param raw: if True func receives the serialized rospy.AnyMsg instance
+        @param unthrottled: if True func receives the serialized rospy.AnyMsg instance of
+        the messages dropped by the throttling as well, e.g. to measure the topic's load
+        """
+        with self._lock:
+            if name in self.dropped:
+                name = "{}_{}".format(name, len(self.dropped))
+            self.dropped[name] = 0
+            # copy on write so that the callback can iterate without the lock
+            if unthrottled:
+                self.unthrottled_consumers = self.unthrottled_consumers + [(name, func)]
+            elif raw:
+                self.raw_consumers = self.raw_consumers + [(name, func)]
+            else:
+                self.consumers = self.consumers + [(name, func)]
+
+        return name
+
+    def get_bw_monitor(self, window_duration):
+        """
+        return the bandwidth stats of the topic over window_duration seconds, shared
+        by all the monitors of this subscription and created on first use
+        """
+        with self._lock:
+            bw = self.bw_monitors.get(window_duration)
+            if bw is not None:
+                return bw
+            bw = self.bw_monitors[window_duration] = ROSTopicBw(self.topic_name, window_duration)
+
+        self.register_consumer("bw ({} s)".format(window_duration), bw.callback_bw, unthrottled=True)
+        return bw
+
+    def throttle(self):
+        """
+        return True if the current message must be dropped to keep to the rate
+        """
+        if not self.period:
+            return False
+
+        now = rospy.get_time()
+        # time reset
+        if self.last_time is not None and now < self.last_time:
+            self.last_time = None
+
+        if self.last_time is not None and now - self.last_time < self.period:
+            self.throttled += 1
+            return True
+
+        self.last_time = now
+        return False
+
+    def callback(self, raw_msg):
+        """
+        ros sub callback, the message is deserialized at most once and shared by all consumers
+        @param raw_msg: serialized message
+        @type  raw_msg: rospy.AnyMsg
+        """
+        self.dispatch(self.unthrottled_consumers, raw_msg)
+
+        if self.throttle():
+            return
+
+        self.dispatch(self.raw_consumers, raw_msg)
+
+        consumers = self.consumers
+        if consumers:
+            try:
+                msg = self.msg_class()
+                msg.deserialize(raw_msg._buff)
+            except Exception as e:
+                # dropped by every consumer of the message instance
+                for name, _ in consumers:
+                    self.dropped[name] += 1
+                rospy.logwarn("Unable to deserialize message on topic %s: %s" % (self.topic_name, e))
+                return
+            self.dispatch(consumers, msg)
+
+    def dispatch(self, consumers, msg):
+        for name, func in consumers:
+            try:
+                func(msg)
+            except Exception as e:
+                self.dropped[name] += 1
+                rospy.logwarn("Consumer '%s' on topic %s dropped a message: %s" % (name, self.topic_name, e))
+
+    def get_dropped(self):
+        """
+        return the number of messages dropped by each consumer
+        """
+        with self._lock:
+            return dict(self.dropped)
+
+
+_subscribers = {}
+_subscribers_lock = Lock()
+
+def get_subscriber(topic_name, msg_class, rate=0):
+    """
+    return the shared subscriber for a topic and throttling rate, creating it on first use
+    """
+    if rate < 0:
+        rate = 0
+
+    key = (topic_name, msg_class._type, rate)
+    with _subscribers_lock:
+        if key not in _subscribers:
+            _subscribers[key] = TopicSubscriber(topic_name, msg_class, rate)
+        return _subscribers[key]
+
+
+def get_subscriber_stats():
+    """
+    return the messages throttled by each subscriber and dropped by each consumer
+    """
+    with _subscribers_lock:
+        subscribers = sorted(_subscribers.items())
+
+    stats = SubscriberStats()
+    stats.header.stamp = rospy.Time.now()
+    for (topic_name, _, rate), subscriber in subscribers:
+        name = topic_name if not rate else "{} ({} Hz)".format(topic_name, rate)
+        stats.topics.append(name)
+        stats.throttled.append(subscriber.throttled)
+        for consumer, dropped in sorted(subscriber.get_dropped().items()):
+            stats.consumer_topics.append(name)
+            stats.consumers.append(consumer)
+            stats.dropped.append(dropped)
+    return stats
+
+
+def advertise_subscriber_stats():
+    """
+    serve the subscriber stats on /sentor/get_subscriber_stats
+    """
+    def get_stats(req):
+        ans = GetSubscriberStatsResponse()
+        ans.stats = get_subscriber_stats()
+        ans.success = True
+        return ans
+
+    return rospy.Service("/sentor/get_subscriber_stats", GetSubscriberStats, get_stats)
+#####################################################################################
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+#####################################################################################
+from threading import Thread, Condition, Lock
+import collections
+import heapq
+import rospy
+
+
+PRIORITY_SAFETY_CRITICAL = 0
+PRIORITY_DEFAULT = 1
+
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce")
+
+
+class _Task(object):
+    __slots__ = ["func", "args", "priority", "key"]
+
+    def __init__(self, func, args, priority, key):
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.key = key
+
+
+class _Queue(object):
+    """
+    the pending tasks of one queue, run in FIFO order by one worker at a time
+    """
+    __slots__ = ["name", "tasks", "max_size", "overflow", "active", "max_depth",
+                 "executed", "dropped", "coalesced"]
+
+    def __init__(self, name, max_size, overflow):
+        self.name = name
+        self.tasks = collections.deque()
+        self.max_size = max_size
+        self.overflow = overflow
+        self.active = False
+        self.max_depth = 0
+        self.executed = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+
+class WorkerPool(object):
+    """
+    WorkerPool runs the tasks of named queues (one per monitor) on a fixed number
+    of worker threads. The tasks of a queue run one at a time in submission order,
+    while the queues are served by priority and then in the order they became
+    ready, so that safety critical tasks overtake informational ones. Queues are
+    bounded: when full the oldest task is dropped, or with the 'coalesce' policy a
+    pending task with the same key is replaced by the new one. Tasks run to
+    completion on their worker, so reserved_workers extra workers only run safety
+    critical tasks, which then still run while the other workers are blocked.
+    """
+    def __init__(self, num_workers=4, reserved_workers=0):
+        self.num_workers = num_workers
+        self.reserved_workers = reserved_workers
+
+        self._cond = Condition(Lock())
+        self.queues = {}
+        self.ready = []
+        self.seq = 0
+
+        for i in range(num_workers + reserved_workers):
+            reserved = i >= num_workers
+            worker = Thread(target=self.run, args=(reserved,), name="sentor worker {}".format(i))
+            worker.daemon = True
+            worker.start()
+
+    def add_queue(self, name, max_size=10, overflow="drop_oldest"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Overflow policy '{}' not supported, use one of {}".format(overflow, OVERFLOW_POLICIES))
+        with self._cond:
+            if name not in self.queues:
+                self.queues[name] = _Queue(name, max(max_size, 1), overflow)
+
+    def submit(self, name, func, args=(), priority=PRIORITY_DEFAULT, key=None):
+        """
+        queue func(*args) on the named queue, key identifies identical tasks for
+        the 'coalesce' policy
+        """
+        with self._cond:
+            queue = self.queues.get(name)
+            if queue is None:
+                self.queues[name] = queue = _Queue(name, 10, "drop_oldest")
+
+            task = _Task(func, args, priority, key)
+
+            if queue.overflow == "coalesce" and key is not None:
+                for i, pending in enumerate(queue.tasks):
+                    if pending.key == key:
+                        # keep the position of the pending task, with the latest arguments
+                        task.priority = min(task.priority, pending.priority)
+                        queue.tasks[i] = task
+                        queue.coalesced += 1
+                        self._make_ready(queue)
+                        return
+
+            if len(queue.tasks) >= queue.max_size:
+                queue.tasks.popleft()
+                queue.dropped += 1
+                rospy.logwarn("Execution queue '{}' full, dropped its oldest execution".format(name))
+
+            queue.tasks.append(task)
+            queue.max_depth = max(queue.max_depth, len(queue.tasks))
+            self._make_ready(queue)
+
+    def _make_ready(self, queue):
+        # must be called with the lock held
+        if queue.active or not queue.tasks:
+            return
+        queue.active = True
+        heapq.heappush(self.ready, (queue.tasks[0].priority, self.seq, queue))
+        self.seq += 1
+        # a reserved worker cannot take every task
+        self._cond.notify_all()
+
+    def run(self, reserved=False):
+        while True:
+            with self._cond:
+                while not self.ready or (reserved and self.ready[0][0] != PRIORITY_SAFETY_CRITICAL):
+                    self._cond.wait()
+                _, _, queue = heapq.heappop(self.ready)
+                task = queue.tasks.popleft()
+
+            try:
+                task.func(*task.args)
+            except Exception as e:
+                rospy.logerr("Exception while executing on queue '{}': {}".format(queue.name, e))
+
+            with self._cond:
+                queue.executed += 1
+                queue.active = False
+                self._make_ready(queue)
+
+    def get_stats(self):
+        """
+        return {queue name: (depth, max depth, executed, dropped, coalesced)}
+        """
+        with self._cond:
+            return dict((name, (len(q.tasks), q.max_depth, q.executed, q.dropped, q.coalesced))
+                        for name, q in self.queues.items())
+
+
+_pool = None
+_pool_lock = Lock()
+
+def get_worker_pool(num_workers=4, reserved_workers=1):
+    """
+    return the worker pool shared by all the monitors, creating it on first use
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(num_workers, reserved_workers)
+        return _pool
+#####################################################################################